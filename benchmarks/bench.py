@@ -0,0 +1,130 @@
+"""End-to-end benchmarks of sep_tools against the local mock server
+
+Runs importOpenAPI, generateOpenAPI, generateAsyncAPI and createQueue for
+every spec of api-samples/ and reports wall time, number of requests, peak
+memory and the time to parse and to resolve the spec.
+
+    $ python benchmarks/bench.py --latency 0.02 --json bench.json
+"""
+import contextlib
+import glob
+import io
+import json
+import logging
+import os
+import sys
+import time
+import tracemalloc
+
+import click
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from sep_tools.EventPortal import EventPortal
+from sep_tools.loader import load_spec
+from sep_tools.mockserver import MockServer
+
+SAMPLES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "api-samples")
+DOMAIN = "BenchDomain"
+APPLICATION = "BenchApp"
+QUEUE = "bench_queue"
+
+
+def measure(mock, fn, setup=None):
+    # run fn twice on the same mock state, once for timing and requests,
+    # once under tracemalloc for the peak memory
+    result = {}
+    for traced in (False, True):
+        with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):
+            if setup: setup()
+            requests = mock.request_count
+            if traced: tracemalloc.start()
+            start = time.perf_counter()
+            fn()
+            elapsed = time.perf_counter() - start
+        if traced:
+            result["peakMemory"] = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+        else:
+            result["wallTime"] = elapsed
+            result["requests"] = mock.request_count - requests
+            result["throttled"] = mock.throttled
+    return result
+
+
+def bench_spec(mock, spec_path, concurrency):
+    portal = lambda **kw: EventPortal("token", base_url=mock.url, concurrency=concurrency, **kw)
+    broker = lambda **kw: EventPortal(host=mock.url, queueName=QUEUE, concurrency=concurrency, **kw)
+    result = {}
+
+    start = time.perf_counter()
+    spec = load_spec(spec_path)
+    result["parseTime"] = time.perf_counter() - start
+    ep = portal()
+    ep.spec = spec
+    start = time.perf_counter()
+    ep.generate_ep_objects()
+    result["resolveTime"] = time.perf_counter() - start
+    result["events"] = len(ep.Events)
+    result["schemas"] = len(ep.Schemas)
+
+    def imported():
+        mock.reset()
+        portal().importOpenAPISpec(spec_path, DOMAIN, APPLICATION)
+
+    result["importOpenAPI"] = measure(mock,
+        lambda: portal().importOpenAPISpec(spec_path, DOMAIN, APPLICATION), mock.reset)
+    result["generateOpenAPI"] = measure(mock,
+        lambda: portal().generateOpenApi(DOMAIN), imported)
+    result["generateAsyncAPI"] = measure(mock,
+        lambda: portal().generateAsyncApi(APPLICATION), imported)
+    result["createQueue"] = measure(mock,
+        lambda: broker().createQueue(spec_path), mock.reset)
+    return result
+
+
+@click.command()
+@click.argument('specs', nargs=-1, type=click.Path(exists=True))
+@click.option('--latency', default=0.0, show_default=True,
+    help='Seconds the mock server adds to every response')
+@click.option('--rate-limit', default=None, type=int,
+    help='Maximum requests per second of the mock server')
+@click.option('--concurrency', default=8, show_default=True,
+    help='Maximum number of concurrent requests of the tool')
+@click.option('--json', 'json_file', type=click.Path(dir_okay=False),
+    help='Write the results as JSON to this file')
+def main(specs, latency, rate_limit, concurrency, json_file):
+    """Benchmark the commands for SPECS, all files of api-samples/ by default"""
+    logging.basicConfig(level=logging.ERROR)
+    specs = specs or sorted(glob.glob(os.path.join(SAMPLES, "*")))
+    results = {}
+    with MockServer(latency=latency, rate_limit=rate_limit) as mock:
+        for spec_path in specs:
+            name = os.path.basename(spec_path)
+            try:
+                results[name] = bench_spec(mock, spec_path, concurrency)
+            except (Exception, SystemExit) as e:
+                results[name] = {"error": " ".join("{}: {}".format(type(e).__name__, e).split())}
+            mock.reset()
+
+    print("{:<40} {:>7} {:>7} {:>8} {:>8}  {:<16} {:>8} {:>6} {:>9}".format(
+        "spec", "events", "schemas", "parse", "resolve", "command", "wall", "reqs", "peak KiB"))
+    for name, result in results.items():
+        if "error" in result:
+            print("{:<40} {}".format(name, result["error"][:80]))
+            continue
+        first = "{:<40} {:>7} {:>7} {:>7.3f}s {:>7.3f}s".format(name, result["events"],
+            result["schemas"], result["parseTime"], result["resolveTime"])
+        for command in ("importOpenAPI", "generateOpenAPI", "generateAsyncAPI", "createQueue"):
+            r = result[command]
+            print("{:<73}  {:<16} {:>7.3f}s {:>6} {:>9}".format(first, command,
+                r["wallTime"], r["requests"], r["peakMemory"]//1024))
+            first = ""
+
+    if json_file:
+        with open(json_file, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
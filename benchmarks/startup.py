@@ -0,0 +1,95 @@
+"""Startup time of the sep CLI
+
+Measures the wall time of short CLI invocations and the import time of
+sep_tools.cmd with 'python -X importtime'. Fails if the CLI module pulls in
+any of the heavy modules only the commands need, or takes longer to import
+than --max-import-ms, so startup regressions are caught:
+
+    $ python benchmarks/startup.py --max-import-ms 150
+"""
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+import click
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+# modules which must not be imported before a command runs
+HEAVY_MODULES = ["requests", "urllib3", "yaml", "sqlite3", "concurrent.futures",
+    "sep_tools.EventPortal", "sep_tools.batch", "sep_tools.client", "sep_tools.semp"]
+# --version is left out, it needs the package to be installed
+INVOCATIONS = [
+    ["--help"],
+    ["importOpenAPI", "--help"],
+    ["generateOpenAPI", "--help"],
+]
+
+
+def run(args, env=None):
+    start = time.perf_counter()
+    subprocess.run([sys.executable]+args, cwd=ROOT, env=env, check=True,
+        stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    return time.perf_counter() - start
+
+
+def import_times():
+    # module -> cumulative import time in microseconds
+    r = subprocess.run([sys.executable, "-X", "importtime", "-c", "import sep_tools.cmd"],
+        cwd=ROOT, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+    times = {}
+    for line in r.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line: continue
+        fields = [f.strip() for f in line[len("import time:"):].split("|")]
+        if fields[1].isdigit():
+            times[fields[2]] = int(fields[1])
+    return times
+
+
+@click.command()
+@click.option('--runs', default=10, show_default=True, type=click.IntRange(1),
+    help='Number of runs of each invocation, the median is reported')
+@click.option('--max-import-ms', default=None, type=float,
+    help='Fail if importing sep_tools.cmd takes longer (median of the runs)')
+@click.option('--json', 'json_file', type=click.Path(dir_okay=False),
+    help='Write the results as JSON to this file')
+def main(runs, max_import_ms, json_file):
+    """Benchmark the startup of the sep CLI"""
+    results = {"invocations": {}}
+    baseline = statistics.median(run(["-c", "pass"]) for i in range(runs))
+    results["interpreter"] = baseline
+    for args in INVOCATIONS:
+        wall = statistics.median(run(["-m", "sep_tools.cmd"]+args) for i in range(runs))
+        results["invocations"][" ".join(args)] = wall
+
+    samples = [import_times() for i in range(runs)]
+    import_ms = statistics.median(s["sep_tools.cmd"] for s in samples)/1000
+    results["importMs"] = import_ms
+    results["heavyModules"] = [m for m in HEAVY_MODULES if m in samples[0]]
+
+    print("{:<32} {:>9}".format("invocation", "wall"))
+    print("{:<32} {:>8.3f}s".format("python -c pass", baseline))
+    for name, wall in results["invocations"].items():
+        print("{:<32} {:>8.3f}s".format("sep "+name, wall))
+    print("{:<32} {:>7.1f}ms".format("import sep_tools.cmd", import_ms))
+
+    if json_file:
+        with open(json_file, "w") as f:
+            json.dump(results, f, indent=2)
+
+    failed = False
+    if results["heavyModules"]:
+        print("sep_tools.cmd imports {}".format(", ".join(results["heavyModules"])), file=sys.stderr)
+        failed = True
+    if max_import_ms is not None and import_ms > max_import_ms:
+        print("importing sep_tools.cmd takes {:.1f}ms, more than {}ms".format(
+            import_ms, max_import_ms), file=sys.stderr)
+        failed = True
+    if failed:
+        raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,19 +1,38 @@
 import logging
 import json
+import math
+import os
 import re
+import sys
+from urllib.parse import quote
 
-import yaml
 from .util import *
+from .resolver import RefResolver
+from .loader import load_spec, SpecCache
+from .cache import MetadataCache
+from .state import SyncState, portal_key
+from .journal import ImportJournal
+from .snapshot import Snapshot, write_snapshot
+from .client import EventPortalClient
+from .semp import SempClient
+from .topics import compact_topics
+from .workers import resolve_schemas
+from .writer import JSONText
+from .metrics import metrics
+from .scheduler import TaskGraph
 
 class EventPortal:
-    spec = {}
-    ApplicationDomains = {}
-    Applications = {}
-    Schemas = {}
-    Events = {}
-    
     _refSchemaRe = re.compile(r'\#\/components\/schemas/([^\/]+)$')
     _base_url = "https://solace.cloud"
+    # collections which could be listed per application domain in bulk
+    _bulk_colls = ["schemas", "events"]
+    # collections whose objects are updated and deleted by --sync
+    _sync_colls = ["schemas", "events"]
+    # the portal returns at most 100 objects per page
+    _max_page_size = 100
+    # maximum length of an ids query parameter, so chunked requests by id
+    # stay well below the URL limits of servers and proxies
+    _max_ids_length = 2000
 
 
     def __init__(self, token="", pubFlag=False, 
@@ -21,9 +40,40 @@ class EventPortal:
         admin_password="default", 
         host="", 
         vpn="default",
-        queueName = "api_queue"):
+        queueName = "api_queue",
+        cycle_policy="ref",
+        max_depth=3,
+        workers=1,
+        concurrency=8,
+        rate_limit=None,
+        bulk_lookup=False,
+        bulk_page_size=100,
+        page_size=100,
+        cache_dir=None,
+        cache_ttl=300,
+        sync=False,
+        state_file="sep-state.json",
+        journal_file=None,
+        resume=False,
+        plan=False,
+        dedup_schemas=True,
+        compact_subscriptions=False,
+        max_overmatch=1,
+        base_url=None,
+        snapshot_file=None,
+        client=None):
 
         super().__init__()
+        self.spec = {}
+        self.ApplicationDomains = {}
+        self.Applications = {}
+        self.Schemas = {}
+        self.Events = {}
+        # coll -> id -> object as last returned by the portal
+        self.objectCache = {}
+        # whether cached responses must be confirmed by the portal
+        self._revalidate = False
+
         self.token = token
         self.pubFlag = pubFlag
         self.admin_user = admin_user
@@ -31,9 +81,46 @@ class EventPortal:
         self.host = host
         self.vpn = vpn
         self.queueName = queueName
+        self.cycle_policy = cycle_policy
+        self.max_depth = max_depth
+        self.workers = workers
+        if base_url: self._base_url = base_url.rstrip("/")
+        if client:
+            # shared by the targets of a batch
+            self.client = client
+        else:
+            # responses of the portal are cached next to the parsed specs
+            metadata_cache = MetadataCache(os.path.join(cache_dir, "metadata.sqlite3"), cache_ttl) \
+                if cache_dir and token else None
+            self.client = EventPortalClient(token, self._base_url, concurrency,
+                cache=metadata_cache, rate_limit=rate_limit)
+        self.bulk_lookup = bulk_lookup
+        self.bulk_page_size = bulk_page_size
+        self.page_size = page_size
+        self.spec_cache = SpecCache(cache_dir) if cache_dir else None
+        self.sync = sync
+        self.state_file = state_file
+        # imports are journaled next to the cache unless a file is given
+        self.journal_file = journal_file or (os.path.join(cache_dir, "journal.jsonl") if cache_dir else None)
+        self.resume = resume
+        self.journal = None
+        self.plan = plan
+        self.dedup_schemas = dedup_schemas
+        self.compact_subscriptions = compact_subscriptions
+        self.max_overmatch = max_overmatch
+        # objects are looked up in the snapshot instead of the portal
+        self.snapshot = Snapshot(snapshot_file) if snapshot_file else None
 
     def importOpenAPISpec(self, spec_path, domain, application):
+        self.prepare_import(spec_path, domain, application)
+        self.run_import()
+
+    def prepare_import(self, spec_path, domain, application):
+        # everything of an import which doesn't need the Event Portal
         self.spec_path = spec_path
+        # objects created or deleted by others since they were cached must not
+        # be missed by the checks, so cached responses are revalidated
+        self._revalidate = True
         self.domainName = domain
         self.appName = application
         self.ApplicationDomains[domain]={
@@ -48,10 +135,40 @@ class EventPortal:
                 "name": application,
             }
         }
-        
-        with open(spec_path) as f:
-            text_context = f.read()
-            self.spec = yaml.safe_load(text_context)
+
+        with metrics.phase("parse"):
+            self._load_spec(spec_path)
+
+        with metrics.phase("generate_ep_objects"):
+            self.generate_ep_objects()
+
+    def run_import(self, plan_out=None):
+        if self.sync:
+            self._apply_state()
+        if self.journal_file and not self.plan:
+            self._open_journal()
+        try:
+            with metrics.phase("check_existed_objects"):
+                self.check_existed_objects()
+            if self.plan:
+                self.plan_all_objects(plan_out)
+            elif self.sync:
+                try:
+                    self.create_all_objects()
+                finally:
+                    self._save_state()
+            else:
+                self.create_all_objects()
+            if self.journal: self.journal.done()
+        finally:
+            if self.journal: self.journal.close()
+
+
+    def _load_spec(self, spec_path):
+        if self.spec_cache:
+            self.spec = self.spec_cache.load(spec_path)
+        else:
+            self.spec = load_spec(spec_path)
 
         version = self.spec.get("openapi")
         if not version:
@@ -62,192 +179,523 @@ class EventPortal:
             logging.error("The open api version of '{}' is {}, must be 3.x.".format(spec_path, version))
             raise SystemExit
 
-        self.generate_ep_objects()
-        self.check_existed_objects()
-        self.create_all_objects()
-        
-
     def generate_ep_objects(self):
-        for path, path_item in self.spec["paths"].items():
-            for method in HTTP_METHODS:
-                if method not in path_item: continue
-                operation = path_item.get(method)
-                operationId = operation.get("operationId")
-                event = {
-                    "schemaName": None,
-                    "payload": {
-                        "name": operationId,
-                        "description": operation.get("description", ""),
-                        "topicName": method.upper()+path,
-                    }
+        resolved = self.spec_cache.resolved(self.cycle_policy, self.max_depth) \
+            if self.spec_cache else None
+        self.resolver = RefResolver(self.spec, self.cycle_policy, self.max_depth, resolved)
+        # content hash -> schema name, component schema name -> schema name
+        self._schemaDigests = {}
+        self._schemaAliases = {}
+        # (schema name, isComponent) -> (content hash, content) by the workers
+        self._serialized = {}
+        operations = [(path, method, path_item.get(method)) for path, path_item \
+            in self.spec["paths"].items() for method in HTTP_METHODS if method in path_item]
+        # components resolved before are taken from the cache instead
+        if self.workers > 1 and not resolved:
+            self._serialize_schemas(operations)
+
+        for path, method, operation in operations:
+            operationId = operation.get("operationId")
+            event = {
+                "schemaName": None,
+                "payload": {
+                    "name": operationId,
+                    "description": operation.get("description", ""),
+                    "topicName": method.upper()+path,
                 }
+            }
 
-                schemaName = self._extract_schema_from_operation(operation)
-                if schemaName : event["schemaName"]=schemaName
-                self.Events[operationId]=event
-        
-    def _extract_schema_from_operation(self, operation):
-        schemaName = None
+            schemaName = self._extract_schema_from_operation(operation)
+            if schemaName : event["schemaName"]=schemaName
+            self.Events[operationId]=event
+
+        if self.spec_cache: self.spec_cache.save()
+
+    def _serialize_schemas(self, operations):
+        # resolve all schemas of the operations on the worker processes
+        tasks = {}
+        for path, method, operation in operations:
+            schema = self._request_schema(operation)
+            if schema is None: continue
+            if schema.get("$ref"):
+                schemaName = self._refSchemaRe.search(schema.get("$ref")).group(1)
+                tasks.setdefault((schemaName, True), None)
+            else:
+                tasks[(operation.get("operationId")+"_schema", False)] = schema
+        results = resolve_schemas(self.spec, [k+(v,) for k, v in tasks.items()],
+            self.cycle_policy, self.max_depth, self.workers, self.dedup_schemas)
+        self._serialized = dict(zip(tasks.keys(), results))
+
+    def _request_schema(self, operation):
         content = operation.get("requestBody", {'content':{}}).get("content")
         jsonkeys = [k for k in content.keys() if k.startswith("application/json")]
         if len(jsonkeys) > 0:
             # only extract the first matched json schema
-            schema = content.get(jsonkeys[0]).get("schema")
+            return content.get(jsonkeys[0]).get("schema")
+        return None
+
+    def _extract_schema_from_operation(self, operation):
+        schemaName = None
+        schema = self._request_schema(operation)
+        if schema is not None:
             if schema.get("$ref"):
                 # Reference Object like #/components/schemas/CouponRequest
                 schemaName = self._refSchemaRe.search(schema.get("$ref")).group(1)
-                if not self.Schemas.get(schemaName): 
-                    self.Schemas[schemaName]={
-                        "id": None,
-                        "payload": {
-                            "contentType": "JSON",
-                            "content": json.dumps(self._get_component_schema(schemaName)),
-                            "name": schemaName,
-                        }
-                    }
+                if schemaName not in self._schemaAliases:
+                    self._schemaAliases[schemaName] = self._add_schema(schemaName, True,
+                        *self._serialized_schema(schemaName, True))
+                schemaName = self._schemaAliases[schemaName]
             else:
                 # Inline Schema Object
                 schemaName = operation.get("operationId")+"_schema"
-                self.Schemas[schemaName]={
-                    "id": None,
-                    "payload": {
-                        "contentType": "JSON",
-                        "content": json.dumps(schema),
-                        "name": schemaName,
-                    }
-                }
+                schemaName = self._add_schema(schemaName, False,
+                    *self._serialized_schema(schemaName, False, schema))
         return schemaName
 
-    def _get_component_schema(self, schemaName):
-        payload = self.spec["components"]["schemas"][schemaName]
-        self._dfs_ref_dict(payload)
-
-        return payload
-
-    def _dfs_ref_dict(self, payload):
-        # Go through all reference object to combine an integrated schema
-        # since Event Portal doesn't support reference insice schema
-        for key, value in payload.items():
-            if type(value) is dict:
-                if value.get("$ref"):
-                    # Reference Object
-                    schemaName = self._refSchemaRe.search(value.get("$ref")).group(1)
-                    payload[key] = self._get_component_schema(schemaName)
-                else:
-                    self._dfs_ref_dict(value)
-
+    def _serialized_schema(self, schemaName, isComponent, schema=None):
+        # (digest, content) of the resolved schema, the content is serialized
+        # when it's sent, until then it shares the resolved components with
+        # all other schemas
+        if (schemaName, isComponent) in self._serialized:
+            return self._serialized[(schemaName, isComponent)]
+        if isComponent:
+            resolved = self.resolver.resolve_component(schemaName)
+        else:
+            resolved = self.resolver.resolve(schema)
+        # the digest is only needed to deduplicate schemas
+        digest = self.resolver.digest(resolved) if self.dedup_schemas else None
+        return digest, JSONText(resolved)
+
+    def _add_schema(self, schemaName, isComponent, digest, content):
+        # identical schemas are created only once in the Event Portal, named
+        # after the first component schema with that content if there is one,
+        # returns the name of the schema to be used
+        sameName = self._schemaDigests.get(digest) if self.dedup_schemas else None
+        if sameName:
+            same = self.Schemas[sameName]
+            if not isComponent or same["isComponent"]:
+                return sameName
+            # rename the schema extracted from an inline schema before
+            del self.Schemas[sameName]
+            for e, v in self.Events.items():
+                if v["schemaName"] == sameName: v["schemaName"] = schemaName
+
+        self.Schemas[schemaName]={
+            "id": None,
+            "isComponent": isComponent,
+            "payload": {
+                "contentType": "JSON",
+                "content": content,
+                "name": schemaName,
+            }
+        }
+        if digest: self._schemaDigests[digest] = schemaName
+        return schemaName
 
-    def check_existed_objects(self):
-        to_check = {
+    def _colls(self):
+        # all collections in the order they must be created
+        return {
             "applicationDomains": self.ApplicationDomains,
             "applications": self.Applications,
             "schemas": self.Schemas,
             "events": self.Events,
         }
 
+    def check_existed_objects(self):
         logging.info("Checking existed objects ...")
         isError = False
-        applicationDomainId = None
-        for coll_name, coll_objs in to_check.items():
-            coll_url = self._base_url+"/api/v1/eventPortal/"+coll_name
-            for obj_name, obj in coll_objs.items():
-                print(".", end="", flush=True)
-                url = coll_url+"?name="+obj_name
-                rJson = rest("get", url, token=self.token)
-                if len(rJson["data"]) > 0:
-                    obj["id"] = rJson["data"][0]["id"]
-                    obj["applicationDomainId"] = rJson["data"][0].get("applicationDomainId")
-                    if coll_name == "applicationDomains":
-                        applicationDomainId = obj["id"]
-                    elif obj["applicationDomainId"] != applicationDomainId:
-                        logging.error("{} '{}' already exists with another Application Domain[id:{}]".\
-                            format(coll_name[:-1].capitalize(), obj_name, obj["applicationDomainId"]))
-                        isError = True
-                    else:
-                        logging.warn("{} '{}' already exists".format(coll_name[:-1].capitalize(), obj_name))
-
-        print()
-        if isError: 
+        for coll_name, coll_objs in self._colls().items():
+            # the domain must be known before other objects could be checked
+            # against it, all objects of the other collections are independent
+            applicationDomainId = self.ApplicationDomains[self.domainName].get("id")
+            # objects with id are already known from the sync state
+            names = [obj_name for obj_name, obj in coll_objs.items() if not obj.get("id")]
+            if self.bulk_lookup and coll_name in self._bulk_colls:
+                index = self._getObjectIndex(coll_name, applicationDomainId)
+                # names not within the domain may still be taken in another one
+                missing = [obj_name for obj_name in names if obj_name not in index]
+                index.update(zip(missing, self.client.map(
+                    lambda obj_name: self._checkObjectByName(coll_name, obj_name), missing)))
+                found_list = [index.get(obj_name) for obj_name in names]
+            else:
+                found_list = self.client.map(
+                    lambda obj_name: self._checkObjectByName(coll_name, obj_name), names)
+            for obj_name, found in zip(names, found_list):
+                if found and not self._existing_obj(coll_name, obj_name, coll_objs[obj_name], found):
+                    isError = True
+
+        print(file=sys.stderr)
+        if isError and not self.plan:
             raise SystemExit
 
+    def _existing_obj(self, coll_name, obj_name, obj, found):
+        # take over the object found on the portal, False if it's within another domain
+        obj["id"] = found["id"]
+        obj["remote"] = found
+        obj["applicationDomainId"] = found.get("applicationDomainId")
+        if coll_name == "applicationDomains":
+            return True
+        elif obj["applicationDomainId"] != self.ApplicationDomains[self.domainName].get("id"):
+            logging.error("{} '{}' already exists with another Application Domain[id:{}]".\
+                format(coll_name[:-1].capitalize(), obj_name, obj["applicationDomainId"]))
+            obj["conflict"] = True
+            return False
+        else:
+            logging.warn("{} '{}' already exists".format(coll_name[:-1].capitalize(), obj_name))
+            return True
 
-    def create_all_objects(self):
-        # 1. create application domain
-        self._create_colls("applicationDomains", self.ApplicationDomains)
-        applicationDomainId = self.ApplicationDomains[self.domainName]["id"]
-
-        # 2. create application
-        self.Applications[self.appName]["payload"]["applicationDomainId"] = applicationDomainId            
-        self._create_colls("applications", self.Applications)
-        applicationId = self.Applications[self.appName]["id"]
-
-        # 3. create all schemas
-        for s, v in self.Schemas.items():
-            if not v.get("id"):
-                v["payload"]["applicationDomainId"] = applicationDomainId
-        self._create_colls("schemas", self.Schemas)
-
-        # 4. create all events
-        for e, v in self.Events.items():
-            if not v.get("id"):
-                event = v["payload"]
-                event["applicationDomainId"] = applicationDomainId
-#                event["consumedApplicationIds"] = [applicationId]
-                if v["schemaName"] in self.Schemas:
-                    event["schemaId"] = self.Schemas[v["schemaName"]]["id"]
-
-        self._create_colls("events", self.Events)
-
-        # 5. update the application to consume or publish all events
-        eventIds = [ v["id"] for e, v in self.Events.items() ]
-        data_json = { "producedEventIds" if self.pubFlag else "consumedEventIds": eventIds}
-        
-        url = self._base_url+"/api/v1/eventPortal/applications/"+applicationId
-        rJson = rest("patch", url, data_json=data_json, token=self.token)
-        logging.info("Events {} setting of Application '{}' on all events successfully.".\
-            format('Published' if self.pubFlag else 'Subscribed', self.appName))
+    def _checkObjectByName(self, coll, name):
+        print(".", end="", flush=True, file=sys.stderr)
+        return self._getObjectByName(coll, name)
 
+    def _getObjectIndex(self, coll, applicationDomainId):
+        # name -> object of all objects within the application domain,
+        # objects of other domains are not listed
+        if not applicationDomainId:
+            return {}
+        print(".", end="", flush=True, file=sys.stderr)
+        query_dict = {"applicationDomainId": applicationDomainId}
+        return {obj["name"]: obj for obj in \
+            self._getAllObjects(coll, query_dict, self.bulk_page_size)}
+
+
+    def create_all_objects(self):
+        # every object is sent as soon as the objects its payload refers to
+        # exist, e.g. an event right after its own schema, instead of after
+        # all objects of the collections before
+        graph = TaskGraph(self.client.executor)
+        # 1. application domain
+        domain = self._graph_node(graph, "applicationDomains", self.domainName,
+            self.ApplicationDomains[self.domainName], [])
+
+        # 2. application and schemas within the domain
+        app = self._graph_node(graph, "applications", self.appName,
+            self.Applications[self.appName], [domain])
+        schemas = {obj_name: self._graph_node(graph, "schemas", obj_name, obj, [domain]) \
+            for obj_name, obj in self.Schemas.items()}
+
+        # 3. events with their schema
+        events = [self._graph_node(graph, "events", obj_name, obj,
+            [domain]+([schemas[obj["schemaName"]]] if obj["schemaName"] in schemas else [])) \
+            for obj_name, obj in self.Events.items()]
+
+        # 4. update the application to consume or publish all events
+        graph.add("applicationEvents", self._link_application_events, [app]+events)
+        with metrics.phase("create_objects"):
+            graph.run()
+
+        # 5. delete events and schemas removed from the spec since last sync
+        if self.sync:
+            self._delete_colls("events", self.Events)
+            self._delete_colls("schemas", self.Schemas)
+
+    def _graph_node(self, graph, coll_name, obj_name, obj, deps):
+        # objects which exist and are not synced need no request
+        fn = None
+        if not obj.get("id") or (self.sync and coll_name in self._sync_colls):
+            fn = lambda: self._send_obj(coll_name, obj_name, obj)
+        return graph.add((coll_name, obj_name), fn, deps)
+
+    def _send_obj(self, coll_name, obj_name, obj):
+        # create the object, or update it if it has changed since last sync
+        if coll_name != "applicationDomains":
+            self._link_payload(coll_name, obj)
+        if not obj.get("id"):
+            with metrics.phase("create_colls."+coll_name, thread=True):
+                self._create_obj(coll_name, obj_name, obj)
+        elif obj.get("journaledHash") == content_hash(obj["payload"]):
+            # sent by the import resumed
+            obj["hash"] = obj["journaledHash"]
+        elif self._is_changed(coll_name, obj_name, obj):
+            with metrics.phase("update_colls."+coll_name, thread=True):
+                updated = self._update_obj(coll_name, obj_name, obj)
+            if not updated:
+                self._recover_obj(coll_name, obj_name, obj)
+        else:
+            obj["hash"] = content_hash(obj["payload"])
+
+    def _link_application_events(self):
+        data_json = self._app_events_payload()
+        app = self.Applications[self.appName]
+        # the hash is only known from the sync state or the journal
+        if app.get("eventsHash") == content_hash(data_json):
+            logging.info("Events of Application '{}' unchanged".format(self.appName))
+        else:
+            url = "/api/v1/eventPortal/applications/"+app["id"]
+            with metrics.phase("link_application_events", thread=True):
+                rJson = self.client.rest("patch", url, data_json=data_json,
+                    accepted_codes=(404,) if self.sync else ())
+            if rJson is None:
+                self._recover_obj("applications", self.appName, app)
+                url = "/api/v1/eventPortal/applications/"+app["id"]
+                with metrics.phase("link_application_events", thread=True):
+                    rJson = self.client.rest("patch", url, data_json=data_json)
+            app["eventsHash"] = content_hash(data_json)
+            self._journal("link", "applications", self.appName, app["id"], app["eventsHash"])
+            logging.info("Events {} setting of Application '{}' on all events successfully.".\
+                format('Published' if self.pubFlag else 'Subscribed', self.appName))
+
+    def _objectId(self, obj):
+        # the id of the object, or its placeholder while planning
+        return obj.get("id") or obj.get("plannedId")
+
+    def _link_payloads(self, coll_name, coll_objs):
+        for obj_name, obj in coll_objs.items():
+            self._link_payload(coll_name, obj)
+
+    def _link_payload(self, coll_name, obj):
+        # fill in the ids of the objects which the payload refers to
+        obj["payload"]["applicationDomainId"] = self._objectId(self.ApplicationDomains[self.domainName])
+        if coll_name == "events" and obj["schemaName"] in self.Schemas:
+            obj["payload"]["schemaId"] = self._objectId(self.Schemas[obj["schemaName"]])
+
+    def _app_events_payload(self):
+        eventIds = [ self._objectId(v) for e, v in self.Events.items() ]
+        return { "producedEventIds" if self.pubFlag else "consumedEventIds": eventIds}
+
+    def plan_all_objects(self, out=None):
+        # dry run of create_all_objects, print what would be sent as JSON
+        objects = {}
+        phases = [{"phase": "check_existed_objects", "requests": self.client.request_count}]
+        for coll_name, coll_objs in self._colls().items():
+            if coll_name != "applicationDomains":
+                self._link_payloads(coll_name, coll_objs)
+            actions = objects[coll_name] = {}
+            for obj_name, obj in coll_objs.items():
+                if obj.get("conflict"):
+                    action = "conflict"
+                elif not obj.get("id"):
+                    action = "create"
+                    obj["plannedId"] = "<new {} '{}'>".format(coll_name[:-1], obj_name)
+                elif self.sync and coll_name in self._sync_colls and \
+                    self._is_changed(coll_name, obj_name, obj):
+                    action = "update"
+                else:
+                    action = "skip"
+                actions[obj_name] = {"action": action, "id": obj.get("id")}
+            phases.append({"phase": coll_name,
+                "requests": sum(1 for a in actions.values() if a["action"] in ("create", "update"))})
+
+        data_json = self._app_events_payload()
+        app = self.Applications[self.appName]
+        unchanged = self.sync and app.get("eventsHash") == content_hash(data_json)
+        phases.append({"phase": "update application events", "requests": 0 if unchanged else 1})
+
+        if self.sync:
+            for coll_name in ["events", "schemas"]:
+                removed = self._removed_objects(coll_name, self._colls()[coll_name])
+                for obj_name, obj_state in removed:
+                    objects[coll_name][obj_name] = {"action": "delete", "id": obj_state["id"]}
+                phases.append({"phase": "delete "+coll_name, "requests": len(removed)})
+
+        for phase in phases:
+            phase["roundTrips"] = math.ceil(phase["requests"]/self.client.concurrency)
+        # the objects are sent as a graph (see create_all_objects), their
+        # requests share the concurrent slots and only wait for the chain of
+        # domain, schema or application, event and application events
+        sent = {p["phase"]: p["requests"] for p in phases[1:] if not p["phase"].startswith("delete ")}
+        levels = [["applicationDomains"], ["applications", "schemas"], ["events"], ["update application events"]]
+        roundTrips = phases[0]["roundTrips"]+max(
+            math.ceil(sum(sent.values())/self.client.concurrency),
+            sum(1 for level in levels if any(sent.get(name) for name in level)))
+        # deletes follow once all objects are sent
+        roundTrips += sum(p["roundTrips"] for p in phases if p["phase"].startswith("delete "))
+        actions = [a["action"] for coll in objects.values() for a in coll.values()]
+        plan = {
+            "spec": self.spec_path,
+            "domain": self.domainName,
+            "application": self.appName,
+            "sync": self.sync,
+            "concurrency": self.client.concurrency,
+            "summary": {action: actions.count(action) for action in \
+                ["create", "update", "delete", "skip", "conflict"]},
+            "requests": sum(p["requests"] for p in phases),
+            "roundTrips": roundTrips,
+            "phases": phases,
+            "objects": objects,
+        }
+        print(json.dumps(plan, indent=2), file=out)
 
     def _create_colls(self, coll_name, coll_objs):
-        # create objects of the same type
-        coll_url = self._base_url+"/api/v1/eventPortal/"+coll_name
-        for obj_name, obj_value in coll_objs.items():
-            if obj_value.get("id"):
-                # means this object has been existed
+        # create objects of the same type, they don't depend on each other
+        # so they are created concurrently
+        to_create = [(obj_name, obj_value) for obj_name, obj_value in coll_objs.items() \
+            if not obj_value.get("id")] # otherwise means this object has been existed
+        with metrics.phase("create_colls."+coll_name):
+            self.client.map(lambda item: self._create_obj(coll_name, *item), to_create)
+
+    def _create_obj(self, coll_name, obj_name, obj_value):
+        coll_url = "/api/v1/eventPortal/"+coll_name
+        # expected_code=201 Created.
+        # The newly saved object is returned in the response body.
+        rJson = self.client.rest("post", coll_url, data_json=obj_value["payload"],\
+            expected_code=201)
+        obj_value["id"] = rJson["data"]["id"]
+        self._cache_object(coll_name, rJson["data"])
+        obj_value["created"] = True
+        obj_value["hash"] = content_hash(obj_value["payload"])
+        self._journal("create", coll_name, obj_name, obj_value["id"], obj_value["hash"])
+        logging.info("{} '{}'[{}] created successfully".\
+            format(coll_name[:-1].capitalize(), obj_name, obj_value["id"]))
+
+# --------------------------- sync ---------------------------
+
+    def _apply_state(self):
+        # objects known from the last sync are neither checked nor created again
+        self.state = SyncState(self.state_file)
+        self.target_state = self.state.target(portal_key(self._base_url, self.token),
+            self.domainName, self.appName)
+        for coll_name, coll_objs in self._colls().items():
+            coll_state = self.target_state.get(coll_name, {})
+            for obj_name, obj in coll_objs.items():
+                if obj_name not in coll_state: continue
+                obj["id"] = coll_state[obj_name]["id"]
+                obj["eventsHash"] = coll_state[obj_name].get("eventsHash")
+
+    def _is_changed(self, coll_name, obj_name, obj):
+        obj_state = self.target_state.get(coll_name, {}).get(obj_name)
+        if obj_state:
+            return obj_state["hash"] != content_hash(obj["payload"])
+        # existing object unknown to the state, compare with the remote one
+        remote = obj.get("remote", {})
+        return any(remote.get(k) != v for k, v in obj["payload"].items())
+
+    def _cache_object(self, coll_name, data):
+        # the contents of the schemas sent are not kept, together they are
+        # as large as all schemas of the spec fully resolved
+        if coll_name != "schemas":
+            self.objectCache.setdefault(coll_name, {})[data["id"]] = data
+
+    def _update_obj(self, coll_name, obj_name, obj_value):
+        # False if the object no longer exists on the portal
+        url = "/api/v1/eventPortal/{}/{}".format(coll_name, obj_value["id"])
+        rJson = self.client.rest("patch", url, data_json=obj_value["payload"], accepted_codes=(404,))
+        if rJson is None:
+            return False
+        self._cache_object(coll_name, rJson["data"])
+        obj_value["hash"] = content_hash(obj_value["payload"])
+        self._journal("update", coll_name, obj_name, obj_value["id"], obj_value["hash"])
+        logging.info("{} '{}'[{}] updated successfully".\
+            format(coll_name[:-1].capitalize(), obj_name, obj_value["id"]))
+        return True
+
+    def _recover_obj(self, coll_name, obj_name, obj):
+        # the object of the sync state was deleted on the portal, its entry
+        # is dropped and it's looked up by name or created like a new one
+        logging.warning("{} '{}'[{}] of the state file no longer exists".\
+            format(coll_name[:-1].capitalize(), obj_name, obj["id"]))
+        self.target_state.get(coll_name, {}).pop(obj_name, None)
+        for key in ("id", "remote", "created", "hash", "eventsHash"):
+            obj.pop(key, None)
+        found = self._getObjectByName(coll_name, obj_name)
+        if not found:
+            with metrics.phase("create_colls."+coll_name, thread=True):
+                self._create_obj(coll_name, obj_name, obj)
+        elif not self._existing_obj(coll_name, obj_name, obj, found):
+            raise SystemExit
+        elif coll_name in self._sync_colls and self._is_changed(coll_name, obj_name, obj):
+            with metrics.phase("update_colls."+coll_name, thread=True):
+                if not self._update_obj(coll_name, obj_name, obj):
+                    logging.error("{} '{}'[{}] was deleted while being updated".\
+                        format(coll_name[:-1].capitalize(), obj_name, obj["id"]))
+                    raise SystemExit
+        else:
+            obj["hash"] = content_hash(obj["payload"])
+
+    def _delete_colls(self, coll_name, coll_objs):
+        # delete the objects created by an earlier sync which are gone from the spec
+        to_delete = self._removed_objects(coll_name, coll_objs)
+        with metrics.phase("delete_colls."+coll_name):
+            self.client.map(lambda item: self._delete_obj(coll_name, *item), to_delete)
+
+    def _removed_objects(self, coll_name, coll_objs):
+        coll_state = self.target_state.get(coll_name, {})
+        return [(obj_name, obj_state) for obj_name, obj_state in coll_state.items() \
+            if obj_name not in coll_objs and obj_state.get("owned") and not obj_state.get("deleted")]
+
+    def _delete_obj(self, coll_name, obj_name, obj_state):
+        url = "/api/v1/eventPortal/{}/{}".format(coll_name, obj_state["id"])
+        # an object already deleted on the portal is done as well
+        self.client.rest("delete", url, expected_code=204, accepted_codes=(404,))
+        self.objectCache.get(coll_name, {}).pop(obj_state["id"], None)
+        obj_state["deleted"] = True
+        self._journal("delete", coll_name, obj_name, obj_state["id"])
+        logging.info("{} '{}'[{}] deleted successfully".\
+            format(coll_name[:-1].capitalize(), obj_name, obj_state["id"]))
+
+    def _open_journal(self):
+        self.journal = ImportJournal(self.journal_file, portal_key(self._base_url, self.token),
+            self.domainName, self.appName)
+        if not self.resume:
+            self.journal.start()
+            return
+        entries = self.journal.entries()
+        if not entries:
+            logging.info("Nothing to resume of Application '{}' in {}".format(self.appName, self.journal_file))
+            return
+        colls = self._colls()
+        for record in entries:
+            coll_name, obj_name = record["coll"], record["name"]
+            if record["action"] == "delete":
+                if self.sync:
+                    self.target_state.get(coll_name, {}).get(obj_name, {})["deleted"] = True
+                continue
+            obj = colls[coll_name].get(obj_name)
+            if obj is None:
+                logging.warning("{} '{}'[{}] of the journal is no longer in the spec".\
+                    format(coll_name[:-1].capitalize(), obj_name, record["id"]))
+                continue
+            obj["id"] = record["id"]
+            if record["action"] == "link":
+                obj["eventsHash"] = record["hash"]
                 continue
-            # expected_code=201 Created.
-            # The newly saved object is returned in the response body.
-            rJson = rest("post", coll_url, data_json=obj_value["payload"],\
-                expected_code=201, token=self.token)
-            obj_value["id"] = rJson["data"]["id"]
-            logging.info("{} '{}'[{}] created successfully".\
-                format(coll_name[:-1].capitalize(), obj_name, obj_value["id"]))
+            obj["journaledHash"] = record["hash"]
+            obj["hash"] = record["hash"]
+            if record["action"] == "create": obj["created"] = True
+        logging.info("Resume import of Application '{}' with {} objects journaled".format(
+            self.appName, len(entries)))
+
+    def _journal(self, action, coll_name, obj_name, obj_id, hash=None):
+        # objects sent outside of run_import, e.g. the domain of a batch, are not journaled
+        if self.journal: self.journal.record(action, coll_name, obj_name, obj_id, hash)
+
+    def _save_state(self):
+        # record what has been sent successfully, objects failed to be sent
+        # keep their former state so they are sent again on next sync
+        for coll_name, coll_objs in self._colls().items():
+            coll_state = self.target_state.setdefault(coll_name, {})
+            for obj_name in list(coll_state.keys()):
+                if obj_name not in coll_objs and \
+                    (coll_state[obj_name].get("deleted") or not coll_state[obj_name].get("owned")):
+                    del coll_state[obj_name]
+            for obj_name, obj in coll_objs.items():
+                if not obj.get("id"): continue
+                obj_state = coll_state.setdefault(obj_name, {"hash": None, "owned": False})
+                obj_state["id"] = obj["id"]
+                obj_state["hash"] = obj.get("hash", obj_state["hash"])
+                obj_state["owned"] = obj_state["owned"] or obj.get("created", False)
+                if obj.get("eventsHash"): obj_state["eventsHash"] = obj["eventsHash"]
+        self.state.save()
 
 # --------------------------- generate Queue ---------------------------
     def createQueue(self, spec_path):
         """Generate a queue based on the specified OpenAPI 3.0 specification by
         subscribing on all related events"""
         self.spec_path = spec_path
-        
-        with open(spec_path) as f:
-            text_context = f.read()
-            self.spec = yaml.safe_load(text_context)
 
-        version = self.spec.get("openapi")
-        if not version:
-            logging.error("There is no 'openapi' filed in {}".format(spec_path))
-            raise SystemExit
+        with metrics.phase("parse"):
+            self._load_spec(spec_path)
 
-        if int(version.split(".")[0]) < 3:
-            logging.error("The open api version of '{}' is {}, must be 3.x.".format(spec_path, version))
-            raise SystemExit
-
-        self.generate_ep_objects()
-        self.__create_queue()
-        self.__subscribe_on_events()
+        with metrics.phase("generate_ep_objects"):
+            self.generate_ep_objects()
+        self.semp = SempClient(self.host, self.vpn, self.admin_user, self.admin_password,
+            self.client.concurrency)
+        with metrics.phase("semp.create_queue"):
+            self.__create_queue()
+        with metrics.phase("semp.add_subscriptions"):
+            self.__subscribe_on_events()
 
     def __create_queue(self):
-        url = "{}/SEMP/v2/config/msgVpns/{}/queues".format(self.host, self.vpn)
         queue =  {
             "egressEnabled": True,
             "ingressEnabled": True,
@@ -255,47 +703,63 @@ class EventPortal:
             "queueName": self.queueName,
         }
 
-        sempv2("post", url, self.admin_user, self.admin_password, queue)
-        logging.info("Queue '{}' created successfully".format(self.queueName))
-
-        pass
+        if self.semp.create_queue(queue):
+            logging.info("Queue '{}' created successfully".format(self.queueName))
+        else:
+            logging.warning("Queue '{}' already exists".format(self.queueName))
 
     def __subscribe_on_events(self):
-        url = "{}/SEMP/v2/config/msgVpns/{}/queues/{}/subscriptions".\
-            format(self.host, self.vpn, self.queueName)
-
         para = re.compile("{[^}]+}")
-        for e, v in self.Events.items():
-            topic = para.sub("*", v["payload"]["topicName"])
-            sub = {"subscriptionTopic":topic}
-            sempv2("post", url, self.admin_user, self.admin_password, sub)
+        topics = [para.sub("*", v["payload"]["topicName"]) for e, v in self.Events.items()]
+        if self.compact_subscriptions:
+            compacted = compact_topics(topics, self.max_overmatch)
+            logging.info("Compact {} topics into {} subscriptions".format(
+                len(set(topics)), len(compacted)))
+            topics = compacted
+        added = self.semp.add_subscriptions(self.queueName, topics)
+        for topic in added:
             logging.info("Queue '{}' subscribed on '{}' successfully".\
                 format(self.queueName, topic))
+        logging.info("Queue '{}' subscribed on {} topics, {} of them already subscribed".\
+            format(self.queueName, len(set(topics)), len(set(topics))-len(added)))
 
 # --------------------------- generate AsyncApi ---------------------------
 
     def generateAsyncApi(self, application_name):
         # 1. get application id by name
-        app_id = self._getObjectIdByName("applications", application_name)
+        with metrics.phase("lookup_application"):
+            app_id = self._getObjectIdByName("applications", application_name)
         if not app_id:
             logging.error("Could not find Application '{}'!".format(application_name))
             raise SystemExit
 
         # 2. generate AsyncApi
-        gen_url = self._base_url+\
-            "/api/v1/eventPortal/applications/{}/generateAsyncApiRequest".format(app_id)
+        rJson = self._generateAsyncApiDoc(app_id)
+        print(json.dumps(rJson,indent=2))
+
+    def _generateAsyncApiDoc(self, app_id):
+        if self.snapshot:
+            # the document the portal generated when the snapshot was taken
+            docs = self.snapshot.getObjectsByIds("asyncApis", [app_id])
+            if not docs:
+                logging.error("No AsyncAPI spec of Application[id:{}] in snapshot {}".format(
+                    app_id, self.snapshot.path))
+                raise SystemExit
+            return docs[0]["document"]
+        gen_url = "/api/v1/eventPortal/applications/{}/generateAsyncApiRequest".format(app_id)
         request = {
             "asyncApiVersion": "2.0.0",
         }
-        rJson = rest("post", gen_url, request, token=self.token)
-        print(json.dumps(rJson,indent=2))
+        with metrics.phase("generate_asyncapi"):
+            return self.client.rest("post", gen_url, request)
 
 
 # --------------------------- generate OpenApi ---------------------------
 
-    def generateOpenApi(self, domain_name):
+    def generateOpenApi(self, domain_name, output=None, format="json"):
         # 1. get the domain id by name
-        domain_obj = self._getObjectByName("applicationDomains", domain_name)        
+        with metrics.phase("lookup_domain"):
+            domain_obj = self._getObjectByName("applicationDomains", domain_name)
         if not domain_obj:
             logging.error("Could not find Application Domain '{}'!".format(domain_name))
             raise SystemExit
@@ -304,31 +768,75 @@ class EventPortal:
         
         # 2. get all events in the given application domain
         query_dict = {"applicationDomainId": domain_id}
-        event_list = self._getAllObjects("events", query_dict)
+        with metrics.phase("list_events"):
+            event_list = self._getAllObjects("events", query_dict)
 
-        # 3. filter external events
-        event_list = [e for e in event_list if \
-            len(e["consumedApplicationIds"])>0]
+            # 3. filter external events
+            event_list = [e for e in event_list if \
+                len(e["consumedApplicationIds"])>0]
 #            len(e["producedApplicationIds"])==0 and len(e["consumedApplicationIds"])>0]
 
         # 4. get all related schemas
-        schema_IDs = set([e["schemaId"] for e in event_list if e["schemaId"]])
-        query_dict = {
-            "ids": ",".join(list(schema_IDs)),
-        }
-        schema_list = self._getAllObjects("schemas", query_dict)
+        schema_IDs = [e["schemaId"] for e in event_list if e["schemaId"]]
+        with metrics.phase("fetch_schemas"):
+            schema_list = self._getObjectsByIds("schemas", schema_IDs)
 
         # 5. generate openapi spec
-        generateOpenAPISpec(domain_name, domain_obj["description"], event_list, schema_list)
-
+        with metrics.phase("write_openapi"):
+            if not output:
+                generateOpenAPISpec(domain_name, domain_obj["description"],
+                    event_list, schema_list, format=format)
+                return
+            with open(output, "w", encoding="utf-8") as f:
+                generateOpenAPISpec(domain_name, domain_obj["description"],
+                    event_list, schema_list, f, format)
+
+# --------------------------- snapshot ---------------------------
+
+    def snapshotDomain(self, domain_name, path, compress=True):
+        """Write the domain, its applications, events and schemas, the events
+        and schemas of other domains they refer to, and the AsyncAPI spec the
+        portal generates of each application, to a snapshot file"""
+        # 1. get the domain id by name
+        with metrics.phase("lookup_domain"):
+            domain_obj = self._getObjectByName("applicationDomains", domain_name)
+        if not domain_obj:
+            logging.error("Could not find Application Domain '{}'!".format(domain_name))
+            raise SystemExit
+        query_dict = {"applicationDomainId": domain_obj["id"]}
+
+        # 2. list all objects of the domain
+        with metrics.phase("list_objects"):
+            colls = {coll_name: list(self._getAllObjects(coll_name, query_dict)) \
+                for coll_name in ["applications", "events", "schemas"]}
+        colls["applicationDomains"] = [domain_obj]
+
+        # 3. add the events of other domains the applications refer to, then their schemas
+        with metrics.phase("fetch_references"):
+            known = {e["id"] for e in colls["events"]}
+            event_ids = [i for app in colls["applications"] for key in ("consumedEventIds", "producedEventIds") \
+                for i in app.get(key) or [] if i not in known]
+            colls["events"] += self._getObjectsByIds("events", event_ids)
+            known = {es["id"] for es in colls["schemas"]}
+            schema_ids = [e["schemaId"] for e in colls["events"] if e["schemaId"] and e["schemaId"] not in known]
+            colls["schemas"] += self._getObjectsByIds("schemas", schema_ids)
+
+        # 4. the AsyncAPI spec of each application, generated by the portal
+        colls["asyncApis"] = self.client.map(lambda app: \
+            {"id": app["id"], "document": self._generateAsyncApiDoc(app["id"])}, colls["applications"])
+
+        with metrics.phase("write_snapshot"):
+            write_snapshot(path, domain_name, colls, compress, self._base_url)
+        logging.info("Snapshot of Application Domain '{}' with {} applications, {} events and {} schemas written to {}".\
+            format(domain_name, len(colls["applications"]), len(colls["events"]), len(colls["schemas"]), path))
 
 # --------------------------- helper methods ---------------------------
 
     def _getObjectByName(self, coll, name):
-        coll_url = "{}/api/v1/eventPortal/{}?name={}".format(
-            self._base_url, coll, name
-        )
-        rJson = rest("get", coll_url, token=self.token)
+        if self.snapshot:
+            return self.snapshot.getObjectByName(coll, name)
+        coll_url = "/api/v1/eventPortal/"+coll
+        rJson = self.client.rest("get", coll_url, params={"name": name}, revalidate=self._revalidate)
         if len(rJson["data"]) == 0:
             return None
         else:
@@ -338,22 +846,71 @@ class EventPortal:
         obj = self._getObjectByName(coll, name)
         return obj["id"] if obj else None
 
-    def _getAllObjects(self, coll, query_dict):
+    def _getObjectsByIds(self, coll, ids):
+        # objects of the given ids in the same order, ids the portal doesn't
+        # know are left out and cached objects are not requested again
+        if self.snapshot:
+            return self.snapshot.getObjectsByIds(coll, ids)
+        cache = self.objectCache.setdefault(coll, {})
+        ids = list(dict.fromkeys(ids))
+        missing = [obj_id for obj_id in ids if obj_id not in cache]
+
+        # 1. split the ids into chunks, each fits into one page and one URL
+        max_ids = min(self.page_size, self._max_page_size)
+        chunks, length = [], 0
+        for obj_id in missing:
+            # ids are joined by a comma, which is encoded as %2C
+            id_length = len(quote(obj_id, safe=""))+3
+            if not chunks or len(chunks[-1]) == max_ids or length+id_length > self._max_ids_length:
+                chunks.append([])
+                length = 0
+            chunks[-1].append(obj_id)
+            length += id_length
+
+        # 2. fetch all chunks concurrently
+        def get_chunk(chunk):
+            params = {"ids": ",".join(chunk), "pageSize": len(chunk), "pageNumber": 1}
+            return self.client.rest("get", "/api/v1/eventPortal/"+coll, params=params)["data"]
+        for data in self.client.imap(get_chunk, chunks):
+            for obj in data:
+                cache[obj["id"]] = obj
+
+        return [cache[obj_id] for obj_id in ids if obj_id in cache]
+
+    def _getAllObjects(self, coll, query_dict, page_size=None):
+        # the first page tells the number of pages, the remaining pages are
+        # then fetched concurrently and their objects yielded in order
+        if self.snapshot:
+            yield from self.snapshot.getAllObjects(coll, query_dict)
+            return
+        get_url = "/api/v1/eventPortal/"+coll
         params = {
-            "pageSize": 100,
+            "pageSize": min(page_size or self.page_size, self._max_page_size),
             "pageNumber": 1
         }
         params.update(query_dict)
 
-        data_list = []
-        while params["pageNumber"]:
-            get_url = "{}/api/v1/eventPortal/{}".format(
-                self._base_url, coll
-            )
-            rJson = rest("get", get_url, params=params, token=self.token)
-            data_list.extend(rJson['data'])
-
-            pagination = safeget(rJson, "meta", "pagination")
-            params["pageNumber"]=pagination["nextPage"]
-        
-        return data_list
\ No newline at end of file
+        rJson = self.client.rest("get", get_url, params=params, revalidate=self._revalidate)
+        yield from rJson['data']
+
+        pagination = safeget(rJson, "meta", "pagination") or {}
+        total_pages = pagination.get("totalPages")
+        if total_pages is None and pagination.get("count") is not None:
+            # the portal may limit the page size, count with the one it used,
+            # which is the size of the first page unless it's the only one
+            page_size = pagination.get("pageSize") or len(rJson['data']) or params["pageSize"]
+            total_pages = math.ceil(pagination["count"]/page_size)
+        if total_pages is None:
+            # without totals the pages could only be followed one by one
+            while pagination.get("nextPage"):
+                params["pageNumber"] = pagination["nextPage"]
+                rJson = self.client.rest("get", get_url, params=params, revalidate=self._revalidate)
+                yield from rJson['data']
+                pagination = safeget(rJson, "meta", "pagination") or {}
+            return
+
+        def get_page(page_number):
+            return self.client.rest("get", get_url, params=dict(params, pageNumber=page_number),
+                revalidate=self._revalidate)['data']
+        for data in self.client.imap(get_page, range(2, total_pages+1)):
+            yield from data
\ No newline at end of file
@@ -0,0 +1,291 @@
+"""Batch commands importing many specs or generating many applications in
+one process, so the targets share one client, its connections and caches,
+and independent targets run concurrently.
+
+A manifest lists the targets of an import as YAML or JSON:
+
+    targets:
+      - spec: specs/orders.yaml     # relative to the manifest
+        domain: Orders              # --domain by default
+        application: OrderService   # the name of the spec file by default
+        pub: false                  # --pub by default
+"""
+import json
+import logging
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+
+from .EventPortal import EventPortal
+from .loader import load_spec
+from .metrics import metrics
+from .util import content_hash
+from .writer import atomic_write, write_document
+
+SPEC_EXTENSIONS = (".json", ".yaml", ".yml")
+# versions of the AsyncAPI specs written by generate_asyncapi_batch
+ASYNCAPI_INDEX = ".sep-asyncapi.json"
+ASYNCAPI_INDEX_VERSION = 1
+
+def load_targets(sources, manifests, domain, pub):
+    # targets of spec files, directories of spec files and manifests
+    targets = []
+    for source in sources:
+        if os.path.isdir(source):
+            targets.extend(_spec_target(os.path.join(source, name), domain, pub) \
+                for name in sorted(os.listdir(source)) if name.endswith(SPEC_EXTENSIONS))
+        else:
+            targets.append(_spec_target(source, domain, pub))
+    for manifest in manifests:
+        base_dir = os.path.dirname(os.path.abspath(manifest))
+        for entry in load_spec(manifest).get("targets") or []:
+            target = _spec_target(os.path.join(base_dir, entry["spec"]),
+                entry.get("domain", domain), entry.get("pub", pub))
+            if entry.get("application"): target["application"] = entry["application"]
+            targets.append(target)
+
+    seen = set()
+    for target in targets:
+        key = (target["domain"], target["application"])
+        if key in seen:
+            logging.error("Application '{}' of Domain '{}' is imported more than once".format(*key[::-1]))
+            raise SystemExit
+        seen.add(key)
+    return targets
+
+def _spec_target(spec_path, domain, pub):
+    return {
+        "spec": spec_path,
+        "domain": domain,
+        "application": os.path.splitext(os.path.basename(spec_path))[0],
+        "pub": pub,
+    }
+
+def _file_name(name):
+    return re.sub(r'[^\w.-]', "_", name)
+
+def _groups(portals):
+    # targets which share an application, schema, event or topic name within
+    # a domain are imported one after another, otherwise both would create it
+    parent = list(range(len(portals)))
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    owners = {}
+    for i, ep in enumerate(portals):
+        keys = [("applications", name) for name in ep.Applications] + \
+            [("schemas", name) for name in ep.Schemas] + \
+            [("events", name) for name in ep.Events] + \
+            [("topics", e["payload"]["topicName"]) for e in ep.Events.values()]
+        for key in keys:
+            j = owners.setdefault((ep.domainName,)+key, i)
+            parent[find(i)] = find(j)
+
+    groups = {}
+    for i, ep in enumerate(portals):
+        groups.setdefault(find(i), []).append(ep)
+    return list(groups.values())
+
+def import_batch(targets, parallel=4, output_dir=None, **options):
+    """Import all targets with one shared client, returns the number of
+    targets failed. With output_dir the result of each target, or its plan
+    with plan=True, is written to <output_dir>/<domain>/<application>.json"""
+    client = None
+    portals = []
+    results = []
+    # 1. parse the specs and generate the objects of all targets
+    for target in targets:
+        ep = EventPortal(pubFlag=target["pub"], client=client, **options)
+        client = ep.client
+        try:
+            ep.prepare_import(target["spec"], target["domain"], target["application"])
+            portals.append(ep)
+        except (Exception, SystemExit) as e:
+            results.append(_run_target(ep, output_dir, e))
+    if not portals:
+        if client: client.close()
+        return len(results)
+
+    try:
+        # 2. look up every domain once, so its objects could be checked and created concurrently
+        domains = {}
+        with metrics.phase("resolve_domains"):
+            for ep in portals:
+                if ep.domainName not in domains:
+                    domains[ep.domainName] = _resolve_domain(ep)
+                elif domains[ep.domainName].get("id"):
+                    ep.ApplicationDomains[ep.domainName].update(id=domains[ep.domainName]["id"],
+                        remote=domains[ep.domainName].get("remote"))
+
+        # 3. run the independent groups of targets concurrently
+        groups = _groups(portals)
+        logging.info("Import {} targets in {} independent groups".format(len(portals), len(groups)))
+        with ThreadPoolExecutor(max_workers=max(1, parallel)) as executor:
+            results += [r for group in executor.map(
+                lambda group: [_run_target(ep, output_dir) for ep in group], groups) for r in group]
+    finally:
+        client.close()
+
+    failed = [r for r in results if not r]
+    logging.info("{} targets imported, {} failed".format(len(results)-len(failed), len(failed)))
+    return len(failed)
+
+def _resolve_domain(ep):
+    # the domain is created ahead of all targets of it unless planning
+    domain = ep.ApplicationDomains[ep.domainName]
+    found = ep._getObjectByName("applicationDomains", ep.domainName)
+    if found:
+        domain.update(id=found["id"], remote=found)
+    elif not ep.plan:
+        ep._create_colls("applicationDomains", ep.ApplicationDomains)
+    return domain
+
+def _run_target(ep, output_dir, error=None):
+    # returns whether the target was imported, errors are logged and
+    # recorded in the result file but don't stop the other targets,
+    # error is the one the target already failed on before
+    out_path = None
+    if output_dir:
+        out_dir = os.path.join(output_dir, _file_name(ep.domainName))
+        os.makedirs(out_dir, exist_ok=True)
+        out_path = os.path.join(out_dir, _file_name(ep.appName)+".json")
+
+    result = {"spec": ep.spec_path, "domain": ep.domainName, "application": ep.appName}
+    try:
+        if error:
+            raise error
+        if ep.plan and out_path:
+            with open(out_path, "w", encoding="utf-8") as f:
+                ep.run_import(f)
+            return True
+        ep.run_import()
+        result["status"] = "imported"
+    except (Exception, SystemExit) as e:
+        logging.error("Failed to import '{}' as Application '{}': {}".format(
+            ep.spec_path, ep.appName, repr(e)))
+        result["status"] = "failed"
+        result["error"] = repr(e)
+
+    if out_path:
+        result["objects"] = {coll_name: {obj_name: {"id": obj.get("id"), "created": bool(obj.get("created"))} \
+            for obj_name, obj in coll_objs.items()} for coll_name, coll_objs in ep._colls().items()}
+        with open(out_path, "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=2)
+            f.write("\n")
+    return result["status"] == "imported"
+
+def generate_asyncapi_batch(applications, output_dir, domains=(), format="json", force=False, **options):
+    """Generate the AsyncAPI spec of each application, and of every application
+    of the domains, concurrently into <output_dir>/<application>.json or .yaml,
+    returns the number of applications failed.
+
+    A spec is only generated again if the updatedTime or version of its
+    application, of one of its events or their schemas or the format changed
+    since it was written, unless force. These are kept in
+    <output_dir>/.sep-asyncapi.json."""
+    ep = EventPortal(**options)
+    try:
+        return _generate_asyncapi_batch(ep, applications, output_dir, domains, format, force)
+    finally:
+        ep.client.close()
+
+def _generate_asyncapi_batch(ep, applications, output_dir, domains, format, force):
+    os.makedirs(output_dir, exist_ok=True)
+
+    # 1. one listing of the applications instead of one lookup per name
+    domain_ids = []
+    with metrics.phase("lookup_domain"):
+        for domain_name in domains:
+            domain_obj = ep._getObjectByName("applicationDomains", domain_name)
+            if not domain_obj:
+                logging.error("Could not find Application Domain '{}'!".format(domain_name))
+                raise SystemExit
+            domain_ids.append(domain_obj["id"])
+    query_dict = {"applicationDomainId": domain_ids[0]} if len(domain_ids) == 1 and not applications else {}
+    with metrics.phase("list_applications"):
+        app_list = list(ep._getAllObjects("applications", query_dict))
+    apps = {}
+    for app in app_list:
+        # applications of the domains come before same named ones of others
+        if app["name"] not in apps or app.get("applicationDomainId") in domain_ids:
+            apps[app["name"]] = app
+    names = list(dict.fromkeys(list(applications) + \
+        [app["name"] for app in app_list if app.get("applicationDomainId") in domain_ids]))
+
+    # 2. versions of the events of all applications and of their schemas, fetched by id in chunks
+    with metrics.phase("check_versions"):
+        event_ids = [event_id for name in names if name in apps for event_id in _event_ids(apps[name])]
+        events = {event["id"]: event for event in ep._getObjectsByIds("events", event_ids)}
+        schema_ids = [schema_id for name in names if name in apps for schema_id in _schema_ids(apps[name], events)]
+        schemas = {schema["id"]: schema for schema in ep._getObjectsByIds("schemas", schema_ids)}
+
+    index_path = os.path.join(output_dir, ASYNCAPI_INDEX)
+    index = _load_index(index_path)
+    extension = ".yaml" if format == "yaml" else ".json"
+
+    def generate(application_name):
+        # returns "generated", "skipped" or "failed"
+        if application_name not in apps:
+            logging.error("Could not find Application '{}'!".format(application_name))
+            return "failed"
+        app = apps[application_name]
+        file_name = _file_name(application_name)+extension
+        fingerprint = content_hash({"application": _version(app),
+            "events": [[event_id, _version(events.get(event_id))] for event_id in _event_ids(app)],
+            "schemas": [[schema_id, _version(schemas.get(schema_id))] for schema_id in _schema_ids(app, events)]})
+        entry = index.pop(application_name, None)
+        # json and compact are both written to .json, so the format is kept too
+        if not force and entry and entry["fingerprint"] == fingerprint and entry["file"] == file_name \
+            and entry.get("format") == format and os.path.exists(os.path.join(output_dir, file_name)):
+            index[application_name] = entry
+            logging.info("AsyncAPI spec of Application '{}' is up to date".format(application_name))
+            return "skipped"
+        try:
+            rJson = ep._generateAsyncApiDoc(app["id"])
+        except (Exception, SystemExit) as e:
+            logging.error("Failed to generate AsyncAPI spec of Application '{}': {}".format(
+                application_name, repr(e)))
+            return "failed"
+        with open(os.path.join(output_dir, file_name), "w", encoding="utf-8") as f:
+            write_document(f, rJson, format)
+        index[application_name] = {"id": app["id"], "fingerprint": fingerprint, "file": file_name,
+            "format": format}
+        return "generated"
+
+    results = ep.client.map(generate, names)
+    _save_index(index_path, index)
+    logging.info("{} AsyncAPI specs generated, {} up to date, {} failed".format(
+        results.count("generated"), results.count("skipped"), results.count("failed")))
+    return results.count("failed")
+
+def _event_ids(app):
+    return sorted(set((app.get("consumedEventIds") or []) + (app.get("producedEventIds") or [])))
+
+def _schema_ids(app, events):
+    # schemas of the events of app, events maps the ids to the events fetched
+    return sorted({events[event_id]["schemaId"] for event_id in _event_ids(app) \
+        if event_id in events and events[event_id].get("schemaId")})
+
+def _version(obj):
+    # what changes whenever the object is updated, None if it's gone
+    if obj is None:
+        return None
+    return [obj.get(key) for key in ("updatedTime", "version", "revisionNumber")]
+
+def _load_index(path):
+    # application name -> {"id", "fingerprint", "file", "format"} of the specs written
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding="utf-8") as f:
+        data = json.load(f)
+    if data.get("version") != ASYNCAPI_INDEX_VERSION:
+        logging.warning("Ignore index {} of version {}".format(path, data.get("version")))
+        return {}
+    return data["applications"]
+
+def _save_index(path, index):
+    with atomic_write(path) as f:
+        json.dump({"version": ASYNCAPI_INDEX_VERSION, "applications": index}, f, indent=2, sort_keys=True)
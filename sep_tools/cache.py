@@ -0,0 +1,79 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+
+CACHE_VERSION = 1
+
+class MetadataCache:
+    """Local SQLite cache of the responses of Event Portal GET requests
+
+    Responses are stored per namespace (a digest of the token, so objects of
+    different orgs are never mixed) and collection. A response younger than
+    'ttl' seconds is used without a request. An older one is revalidated with
+    If-None-Match if the portal returned an ETag for it, or dropped otherwise.
+    Revalidated responses are kept for at most 'max_age' seconds.
+    """
+
+    def __init__(self, path, ttl=300, max_age=86400):
+        self.path = path
+        self.ttl = ttl
+        self.max_age = max_age
+        dir_name = os.path.dirname(os.path.abspath(path))
+        os.makedirs(dir_name, exist_ok=True)
+        self._lock = threading.Lock()
+        # requests run on several threads, all of them use this connection
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        version = self._db.execute("PRAGMA user_version").fetchone()[0]
+        if version != CACHE_VERSION:
+            self._db.execute("DROP TABLE IF EXISTS responses")
+            self._db.execute("PRAGMA user_version={}".format(CACHE_VERSION))
+        self._db.execute("""CREATE TABLE IF NOT EXISTS responses (
+            namespace TEXT, key TEXT, coll TEXT, body BLOB, etag TEXT, stored REAL,
+            PRIMARY KEY (namespace, key))""")
+        self.evict()
+
+    @staticmethod
+    def namespace(token):
+        return hashlib.sha256(token.encode("utf-8")).hexdigest()[:32]
+
+    def get(self, namespace, key):
+        # (body, etag, fresh) of a cached response or None
+        with self._lock:
+            row = self._db.execute("SELECT body, etag, stored FROM responses "
+                "WHERE namespace=? AND key=?", (namespace, key)).fetchone()
+        if not row:
+            return None
+        body, etag, stored = row
+        age = time.time()-stored
+        if age >= self.ttl and not etag or age >= self.max_age:
+            return None
+        return body, etag, age < self.ttl
+
+    def put(self, namespace, coll, key, body, etag=None):
+        with self._lock:
+            self._db.execute("INSERT OR REPLACE INTO responses VALUES (?,?,?,?,?,?)",
+                (namespace, key, coll, body, etag, time.time()))
+
+    def touch(self, namespace, key):
+        # the response has been revalidated
+        with self._lock:
+            self._db.execute("UPDATE responses SET stored=? WHERE namespace=? AND key=?",
+                (time.time(), namespace, key))
+
+    def invalidate(self, namespace, colls):
+        with self._lock:
+            self._db.executemany("DELETE FROM responses WHERE namespace=? AND coll=?",
+                [(namespace, coll) for coll in colls])
+
+    def evict(self):
+        now = time.time()
+        with self._lock:
+            self._db.execute("DELETE FROM responses WHERE stored<? OR (etag IS NULL AND stored<?)",
+                (now-self.max_age, now-self.ttl))
+
+    def close(self):
+        with self._lock:
+            self._db.close()
@@ -0,0 +1,149 @@
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlencode, urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from .util import rest, send, check_response
+
+EP_PATH = "/api/v1/eventPortal/"
+
+class EventPortalClient:
+    """REST client of the Event Portal API
+
+    All requests share one pooled session, so connections to solace.cloud
+    are reused, and 'map' runs independent requests concurrently on at
+    most 'concurrency' threads. With 'rate_limit' requests are sent at most
+    that many times per second.
+
+    With a MetadataCache, GET requests are answered from the cache while
+    their response is fresh, unless revalidate is set, and every write
+    invalidates the cached responses of the collection it changes.
+    """
+
+    # collections whose objects are changed by writes to another one, e.g.
+    # the application ids of the events consumed by an application
+    _linked_colls = {"applications": ["events"], "events": ["applications"]}
+    # actions requested by POST which don't change any object
+    _read_only_actions = ["generateAsyncApiRequest"]
+
+    def __init__(self, token, base_url="https://solace.cloud",
+        concurrency=8, retries=5, backoff=0.5, cache=None, rate_limit=None):
+        self.token = token
+        self.base_url = base_url
+        self.concurrency = max(1, concurrency)
+        self.retries = retries
+        self.backoff = backoff
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.concurrency)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self._executor = None
+        self.request_count = 0
+        self._lock = threading.Lock()
+        self.rate_limit = rate_limit
+        self._next_slot = 0.0
+        self.cache = cache
+        if cache:
+            self._namespace = cache.namespace(token)
+            # increased by every write, responses requested before are not cached
+            self._generation = 0
+
+    def rest(self, verb, url, data_json=None, expected_code=200, params=None, revalidate=False,
+        accepted_codes=()):
+        # with revalidate a cached response is only used if the portal
+        # confirms it's still current
+        if url.startswith("/"):
+            url = self.base_url+url
+        if self.cache and verb == "get" and expected_code == 200:
+            return self._cached_get(url, params, revalidate)
+        self._count()
+        try:
+            return rest(verb, url, data_json, expected_code, params,
+                token=self.token, session=self.session,
+                retries=self.retries, backoff=self.backoff, accepted_codes=accepted_codes)
+        finally:
+            # a failed write may still have been applied
+            if self.cache and verb != "get":
+                self._invalidate(url)
+
+    def _count(self):
+        # count a request and wait for its slot under the rate limit
+        with self._lock:
+            self.request_count += 1
+            if not self.rate_limit:
+                return
+            now = time.monotonic()
+            slot = max(now, self._next_slot)
+            self._next_slot = slot+1.0/self.rate_limit
+        if slot > now:
+            time.sleep(slot-now)
+
+    def _path(self, url):
+        # e.g. ["events", "<id>"] of an Event Portal url
+        path = urlparse(url).path
+        return path[path.find(EP_PATH)+len(EP_PATH):].split("/") if EP_PATH in path else [""]
+
+    def _cached_get(self, url, params, revalidate=False):
+        key = url+"?"+urlencode(sorted((params or {}).items()))
+        with self._lock:
+            generation = self._generation
+        entry = self.cache.get(self._namespace, key)
+        if entry and entry[2] and not revalidate:
+            return json.loads(entry[0])
+
+        headers = {"content-type": "application/json", "Authorization": "Bearer "+self.token}
+        if entry and entry[1]:
+            headers["If-None-Match"] = entry[1]
+        self._count()
+        r = send("get", url, self.session, self.retries, self.backoff,
+            headers=headers, params=params)
+        if entry and r.status_code == 304:
+            self.cache.touch(self._namespace, key)
+            return json.loads(entry[0])
+
+        rJson = check_response("get", url, r)
+        with self._lock:
+            if generation == self._generation:
+                self.cache.put(self._namespace, self._path(url)[0], key,
+                    r.content, r.headers.get("ETag"))
+        return rJson
+
+    def _invalidate(self, url):
+        path = self._path(url)
+        if path[-1] in self._read_only_actions:
+            return
+        with self._lock:
+            self._generation += 1
+        self.cache.invalidate(self._namespace, [path[0]]+self._linked_colls.get(path[0], []))
+
+    def map(self, fn, *iterables):
+        # like the builtin map, but calls run concurrently and results are
+        # returned as a list in the order of the arguments
+        return list(self.imap(fn, *iterables))
+
+    def imap(self, fn, *iterables):
+        # same as map, but results are yielded in order as soon as they are done
+        if self.concurrency == 1:
+            return map(fn, *iterables)
+        return self.executor.map(fn, *iterables)
+
+    @property
+    def executor(self):
+        # the pool running the concurrent requests, created on first use
+        with self._lock:
+            if not self._executor:
+                self._executor = ThreadPoolExecutor(max_workers=self.concurrency)
+            return self._executor
+
+    def close(self):
+        if self._executor:
+            self._executor.shutdown()
+            self._executor = None
+        self.session.close()
+        if self.cache:
+            self.cache.close()
@@ -1,37 +1,175 @@
 import click
 import logging
+import sys
 
-from .EventPortal import EventPortal
+# only light modules are imported here, the Event Portal, SEMP and YAML
+# dependencies are imported by the commands which use them, so --help,
+# --version and the startup of every command stay fast
+from .resolver import CYCLE_POLICIES
+from .writer import FORMATS
+from .metrics import metrics, METRICS_FORMATS
 
-logging.basicConfig(level=logging.INFO)
+# -------------------------- shared options --------------------------
+def _options(*options):
+    # a single decorator applying the options in the order given
+    def decorator(f):
+        for option in reversed(options):
+            f = option(f)
+        return f
+    return decorator
+
+def _portal_options(token_required=True):
+    return _options(
+        click.option('--token', envvar='EVENT_PORTAL_TOKEN', required=token_required,
+            help="The API token of Solace's Cloud REST API, could be set with env variable [EVENT_PORTAL_TOKEN]"),
+        click.option('--base-url', envvar='EVENT_PORTAL_URL', default="https://solace.cloud", show_default=True,
+            help="URL of Solace's Cloud REST API, could be set with env variable [EVENT_PORTAL_URL]"))
+
+def _concurrency_option(server="the Event Portal"):
+    return click.option('--concurrency', default=8, show_default=True, type=click.IntRange(1),
+        help='Maximum number of concurrent requests to {}'.format(server))
+
+def _cache_dir_option(cached="Event Portal objects"):
+    return click.option('--cache-dir', envvar='SEP_CACHE_DIR', type=click.Path(file_okay=False),
+        help='Directory to cache {} in, could be set with env variable [SEP_CACHE_DIR]'.format(cached))
+
+def _cache_options(cached="Event Portal objects"):
+    return _options(
+        _cache_dir_option(cached),
+        click.option('--cache-ttl', default=300, show_default=True, type=click.IntRange(0),
+            help='Seconds cached Event Portal objects are used without asking the portal'))
+
+_page_size_option = click.option('--page-size', default=100, show_default=True, type=click.IntRange(1, 100),
+    help='Page size of the listing requests, the portal allows at most 100')
+
+_format_option = click.option('--format', 'format', type=click.Choice(FORMATS), default="json", show_default=True,
+    help='Output format, json is indented by 2 spaces, compact is json without whitespace')
+
+_from_snapshot_option = click.option('--from-snapshot', type=click.Path(exists=True, dir_okay=False),
+    help='Generate from a file written by the snapshot command instead of the Event Portal, --token is not needed')
+
+# options of importOpenAPI and importOpenAPIBatch
+_import_options = _options(
+    click.option('--pub', default=False, show_default=True, is_flag=True,
+        help='Publish all related events insted of subscribe on them'),
+    _portal_options(),
+    click.option('--cycle-policy', default="ref", show_default=True,
+        type=click.Choice(CYCLE_POLICIES),
+        help='How to inline recursive schemas: keep the $ref or unroll up to --max-depth levels'),
+    click.option('--max-depth', default=3, show_default=True,
+        help='Maximum levels a recursive schema is unrolled with --cycle-policy=depth'),
+    click.option('--workers', default=1, show_default=True, type=click.IntRange(1),
+        help='Number of processes resolving and serializing the schemas of a spec'),
+    _concurrency_option(),
+    click.option('--rate-limit', default=None, type=click.FloatRange(0, min_open=True),
+        help='Maximum number of requests per second to the Event Portal'),
+    click.option('--bulk-lookup', default=False, show_default=True, is_flag=True,
+        help='Check existed schemas and events by listing the whole domain, only those not in it are queried by name'),
+    click.option('--bulk-page-size', default=100, show_default=True, type=click.IntRange(1, 100),
+        help='Page size of the listing requests of --bulk-lookup, the portal allows at most 100'),
+    _cache_options("parsed specs and Event Portal objects"),
+    click.option('--journal-file', type=click.Path(dir_okay=False),
+        help='The file every object sent to the Event Portal is recorded in as it goes, journal.jsonl in --cache-dir by default'),
+    click.option('--resume', default=False, show_default=True, is_flag=True,
+        help='Continue the import which failed last, without checking or sending the objects of the journal again'),
+    click.option('--dedup-schemas/--no-dedup-schemas', default=True, show_default=True,
+        help='Create a single schema for request bodies with identical content'))
 
 @click.group()
 @click.version_option()
-def cli():
-    pass
+@click.option('--metrics', 'metrics_file', type=click.Path(dir_okay=False, allow_dash=True),
+    help='Write the duration, requests, latency, bytes and retries of each phase to this file, - for stderr')
+@click.option('--metrics-format', type=click.Choice(METRICS_FORMATS), default="json", show_default=True,
+    help='Format of --metrics, a JSON summary or the Prometheus text format')
+@click.option('--profile', 'profile_file', type=click.Path(dir_okay=False),
+    help='Run the command under cProfile and dump the stats to this file, to be read by pstats')
+@click.pass_context
+def cli(ctx, metrics_file, metrics_format, profile_file):
+    logging.basicConfig(level=logging.INFO)
+    if profile_file:
+        import cProfile
+        profiler = cProfile.Profile()
+        profiler.enable()
+        def dump_profile():
+            profiler.disable()
+            profiler.dump_stats(profile_file)
+            logging.info("Profile stats dumped to {}".format(profile_file))
+        ctx.call_on_close(dump_profile)
+
+    if metrics_file:
+        metrics.reset()
+        metrics.enabled = True
+        def write_metrics():
+            if metrics_file == "-":
+                metrics.write(sys.stderr, metrics_format)
+            else:
+                with open(metrics_file, "w", encoding="utf-8") as f:
+                    metrics.write(f, metrics_format)
+        ctx.call_on_close(write_metrics)
 
 # -------------------------- importOpenAPI --------------------------
 @cli.command(name="importOpenAPI")
 @click.argument('open_api_spec_file', type=click.Path(exists=True))
 @click.option('--domain', default="TestDomain", show_default=True, 
     help='Application Domain')
-@click.option('--pub', default=False, show_default=True, is_flag=True,
-    help='Publish all related events insted of subscribe on them')
 @click.option('--application', default="TestApp", show_default=True,
     help='Application')
-@click.option('--token', envvar='EVENT_PORTAL_TOKEN', required=True,
-    help="The API token of Solace's Cloud REST API, could be set with env variable [EVENT_PORTAL_TOKEN]")
-def cmdImportOpenAPI(open_api_spec_file, domain, pub, application, token):
+@_import_options
+@click.option('--sync', default=False, show_default=True, is_flag=True,
+    help='Update changed and delete removed schemas and events according to the state file')
+@click.option('--state-file', default="sep-state.json", show_default=True, type=click.Path(dir_okay=False),
+    help='The file keeping ids and content hashes of the objects imported with --sync')
+@click.option('--plan', default=False, show_default=True, is_flag=True,
+    help='Only print the objects to create, update or delete and the requests needed as JSON')
+def cmdImportOpenAPI(open_api_spec_file, domain, pub, application, token,
+    cycle_policy, max_depth, workers, concurrency, rate_limit, bulk_lookup, bulk_page_size, cache_dir, cache_ttl,
+    sync, state_file, journal_file, resume, plan, dedup_schemas, base_url):
     """Generate an Application based on the specified OpenAPI 3.0 specification by
     subscribing on all related events"""
+    _require_journal(journal_file, cache_dir, resume)
+    from .EventPortal import EventPortal
 
     logging.info("Import file '{}' to build Application '{}' within Domain '{}'".format(
         open_api_spec_file, application, domain
     ))
-    ep = EventPortal(token, pub)
+    ep = EventPortal(token, pub, cycle_policy=cycle_policy, max_depth=max_depth, workers=workers,
+        concurrency=concurrency, rate_limit=rate_limit, bulk_lookup=bulk_lookup, bulk_page_size=bulk_page_size,
+        cache_dir=cache_dir, cache_ttl=cache_ttl, sync=sync, state_file=state_file,
+        journal_file=journal_file, resume=resume, plan=plan, dedup_schemas=dedup_schemas, base_url=base_url)
     ep.importOpenAPISpec(open_api_spec_file, domain, application)
 
-# -------------------------- importOpenAPI --------------------------
+# -------------------------- importOpenAPIBatch --------------------------
+@cli.command(name="importOpenAPIBatch")
+@click.argument('sources', nargs=-1, type=click.Path(exists=True))
+@click.option('--manifest', multiple=True, type=click.Path(exists=True, dir_okay=False),
+    help='YAML or JSON file listing the targets with their spec, domain, application and pub')
+@click.option('--domain', default="TestDomain", show_default=True,
+    help='Application Domain of the targets without one in the manifest')
+@_import_options
+@click.option('--parallel', default=4, show_default=True, type=click.IntRange(1),
+    help='Maximum number of targets imported at the same time')
+@click.option('--plan', default=False, show_default=True, is_flag=True,
+    help='Only write the objects to create and the requests needed of each target as JSON')
+@click.option('-o', '--output-dir', type=click.Path(file_okay=False),
+    help='Directory to write the result or the plan of each target to as <domain>/<application>.json')
+def cmdImportOpenAPIBatch(sources, manifest, domain, pub, token, base_url, cycle_policy, max_depth,
+    workers, concurrency, rate_limit, parallel, bulk_lookup, bulk_page_size, cache_dir, cache_ttl, journal_file, resume,
+    plan, dedup_schemas, output_dir):
+    """Import many OpenAPI 3.0 specifications, given as files, directories of
+    files or manifests, each into its own Application"""
+    _require_journal(journal_file, cache_dir, resume)
+    from .batch import load_targets, import_batch
+
+    targets = load_targets(sources, manifest, domain, pub)
+    logging.info("Import {} specs".format(len(targets)))
+    failed = import_batch(targets, parallel, output_dir, token=token, base_url=base_url,
+        cycle_policy=cycle_policy, max_depth=max_depth, workers=workers, concurrency=concurrency,
+        rate_limit=rate_limit, bulk_lookup=bulk_lookup, bulk_page_size=bulk_page_size, cache_dir=cache_dir,
+        cache_ttl=cache_ttl, journal_file=journal_file, resume=resume, plan=plan, dedup_schemas=dedup_schemas)
+    if failed:
+        raise SystemExit(1)
+
+# -------------------------- createQueue --------------------------
 @cli.command(name="createQueue")
 @click.argument('open_api_spec_file', type=click.Path(exists=True))
 @click.option('--admin-user', default='admin', show_default=True,
@@ -44,9 +182,17 @@ def cmdImportOpenAPI(open_api_spec_file, domain, pub, application, token):
     help='The name of the message vpn')
 @click.option('--queue', required=True,
     help='The name of the queue to create')
-def createQueue(open_api_spec_file, admin_user, admin_password, host, vpn, queue):
+@_cache_dir_option("parsed specs")
+@_concurrency_option("the broker")
+@click.option('--compact-subscriptions', default=False, show_default=True, is_flag=True,
+    help='Merge the topics into fewer subscriptions with wildcards')
+@click.option('--max-overmatch', default=1, show_default=True, type=click.IntRange(0),
+    help='Maximum number of unrequested topics a single wildcard of --compact-subscriptions may match')
+def createQueue(open_api_spec_file, admin_user, admin_password, host, vpn, queue, cache_dir,
+    concurrency, compact_subscriptions, max_overmatch):
     """Generate a queue based on the specified OpenAPI 3.0 specification by
     subscribing on all related events"""
+    from .EventPortal import EventPortal
 
     if host[-1]=='/':
         host=host[:-1]
@@ -57,36 +203,123 @@ def createQueue(open_api_spec_file, admin_user, admin_password, host, vpn, queue
         admin_password=admin_password,
         host=host,
         vpn=vpn,
-        queueName=queue,)
+        queueName=queue,
+        cache_dir=cache_dir,
+        concurrency=concurrency,
+        compact_subscriptions=compact_subscriptions,
+        max_overmatch=max_overmatch)
     ep.createQueue(open_api_spec_file)
 
 # -------------------------- generateAsyncAPI --------------------------
 @cli.command(name="generateAsyncAPI")
 @click.argument('application')
-@click.option('--token', envvar='EVENT_PORTAL_TOKEN', required=True,
-    help="The API token of Solace's Cloud REST API, could be set with env variable [EVENT_PORTAL_TOKEN]")
-def generateAsyncAPI(application, token):
+@_portal_options(token_required=False)
+@_cache_options()
+@_from_snapshot_option
+def generateAsyncAPI(application, token, base_url, cache_dir, cache_ttl, from_snapshot):
     """Generate an AsyncAPI spec for the specified Application"""
+    from .EventPortal import EventPortal
+
+    _require_token(token, from_snapshot)
 
     logging.info("Generate AsyncAPI spec for the Application '{}'".format(
          application
     ))
-    ep = EventPortal(token)
+    ep = EventPortal(token, base_url=base_url, cache_dir=cache_dir, cache_ttl=cache_ttl,
+        snapshot_file=from_snapshot)
     ep.generateAsyncApi(application)
 
+# -------------------------- generateAsyncAPIBatch --------------------------
+@cli.command(name="generateAsyncAPIBatch")
+@click.argument('applications', nargs=-1)
+@click.option('--applications-file', type=click.File(),
+    help='File with one application name per line, - for stdin')
+@click.option('--domain', 'domains', multiple=True,
+    help='Generate the specs of all Applications of this Application Domain, could be given more than once')
+@click.option('-o', '--output-dir', required=True, type=click.Path(file_okay=False),
+    help='Directory to write the spec of each application to as <application>.json or .yaml')
+@_format_option
+@click.option('--force', default=False, show_default=True, is_flag=True,
+    help='Generate all specs again, even those whose Application and events are unchanged')
+@_portal_options(token_required=False)
+@_concurrency_option()
+@_cache_options()
+@_from_snapshot_option
+def generateAsyncAPIBatch(applications, applications_file, domains, output_dir, format, force, token, base_url,
+    concurrency, cache_dir, cache_ttl, from_snapshot):
+    """Generate the AsyncAPI spec of each of the specified Applications, or of
+    all Applications of the Domains, into its own file"""
+    from .batch import generate_asyncapi_batch
+
+    _require_token(token, from_snapshot)
+
+    applications = list(applications)
+    if applications_file:
+        applications += [line.strip() for line in applications_file if line.strip()]
+    if not applications and not domains:
+        raise click.UsageError("No Application or --domain given")
+    logging.info("Generate AsyncAPI specs for {} Applications and the Applications of {} Domains".format(
+        len(applications), len(domains)))
+    failed = generate_asyncapi_batch(applications, output_dir, domains, format, force, token=token,
+        base_url=base_url, concurrency=concurrency, cache_dir=cache_dir, cache_ttl=cache_ttl,
+        snapshot_file=from_snapshot)
+    if failed:
+        raise SystemExit(1)
+
 # -------------------------- generateOpenAPI --------------------------
 @cli.command(name="generateOpenAPI")
 @click.argument('domain-name')
-@click.option('--token', envvar='EVENT_PORTAL_TOKEN', required=True,
-    help="The API token of Solace's Cloud REST API, could be set with env variable [EVENT_PORTAL_TOKEN]")
-def generateOpenApi(domain_name, token):
+@_portal_options(token_required=False)
+@click.option('-o', '--output', type=click.Path(dir_okay=False),
+    help='File the OpenAPI spec is written to, stdout by default')
+@_format_option
+@_page_size_option
+@_concurrency_option()
+@_cache_options()
+@_from_snapshot_option
+def generateOpenApi(domain_name, token, base_url, output, format, page_size, concurrency,
+    cache_dir, cache_ttl, from_snapshot):
     """Generate a OpenAPI spec for the specified Domain that represents all the external events that the domain receives"""
+    from .EventPortal import EventPortal
+
+    _require_token(token, from_snapshot)
 
     logging.info("Generate OpenAPI spec for the Application Domain '{}'".format(
          domain_name
     ))
-    ep = EventPortal(token)
-    ep.generateOpenApi(domain_name)
+    ep = EventPortal(token, base_url=base_url, concurrency=concurrency, page_size=page_size,
+        cache_dir=cache_dir, cache_ttl=cache_ttl, snapshot_file=from_snapshot)
+    ep.generateOpenApi(domain_name, output, format)
+
+# -------------------------- snapshot --------------------------
+@cli.command(name="snapshot")
+@click.argument('domain-name')
+@click.option('-o', '--output', required=True, type=click.Path(dir_okay=False),
+    help='File the snapshot is written to')
+@click.option('--compress/--no-compress', default=True, show_default=True,
+    help='Compress the snapshot with gzip, an uncompressed one is memory-mapped when read')
+@_portal_options()
+@_page_size_option
+@_concurrency_option()
+def snapshot(domain_name, output, compress, token, base_url, page_size, concurrency):
+    """Write the Applications, events, schemas and AsyncAPI specs of the
+    specified Domain to a file, which generateOpenAPI and generateAsyncAPI
+    could use with --from-snapshot"""
+    from .EventPortal import EventPortal
+
+    logging.info("Snapshot the Application Domain '{}'".format(domain_name))
+    ep = EventPortal(token, base_url=base_url, concurrency=concurrency, page_size=page_size)
+    ep.snapshotDomain(domain_name, output, compress)
+
+def _require_token(token, from_snapshot):
+    # commands which could run from a snapshot need the token only without one
+    if not token and not from_snapshot:
+        raise click.UsageError("Missing option '--token' or '--from-snapshot'")
+
+def _require_journal(journal_file, cache_dir, resume):
+    # imports are journaled only into a file given or the cache directory
+    if resume and not journal_file and not cache_dir:
+        raise click.UsageError("--resume needs the journal of '--journal-file' or '--cache-dir'")
 
 
 if __name__ == '__main__':
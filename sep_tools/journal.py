@@ -0,0 +1,142 @@
+import contextlib
+import json
+import logging
+import os
+import threading
+
+from .writer import atomic_write
+
+try:
+    import fcntl
+except ImportError:
+    # no file locks, the journal is never compacted
+    fcntl = None
+
+class ImportJournal:
+    """Append-only journal of 'importOpenAPI', one JSON record per line
+
+    Every object sent to the Event Portal is recorded as soon as the portal
+    confirmed it, so an import which died halfway could be resumed with
+    --resume: the objects recorded since the last start of the same
+    domain/application of the same portal are neither looked up nor sent
+    again. The portal is told by its URL and a digest of the token, like in
+    the sync state.
+
+    {"portal": "<base url> <token digest>", "target": "<domain>/<application>", "action": "start"}
+    {"portal": "...", "target": "...", "action": "create", "coll": "schemas", "name": "...", "id": "...", "hash": "..."}
+    {"portal": "...", "target": "...", "action": "update" | "delete" | "link", ...}
+    {"portal": "...", "target": "...", "action": "done"}
+
+    Each record is a single append and flushed to disk before the import
+    goes on, so concurrent imports could share a journal and a crash loses
+    at most the record being written. Once an import is done the journal is
+    compacted to the records of the imports which are not, so it only grows
+    with the imports left to resume.
+    """
+
+    def __init__(self, path, portal, domain, application):
+        self.path = path
+        self.portal = portal
+        self.target = "{}/{}".format(domain, application)
+        self._fd = None
+        # the lock of the file is shared by all threads using self._fd, so
+        # they take turns, records confirmed after close are still written
+        self._lock = threading.Lock()
+        self._closed = False
+
+    def entries(self):
+        # records of the target since its last start, none if that run is done
+        entries = []
+        for record in self._records():
+            if record.get("portal") != self.portal or record.get("target") != self.target: continue
+            if record["action"] in ("start", "done"):
+                entries = []
+            else:
+                entries.append(record)
+        return entries
+
+    def _records(self):
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    # the last record of a crashed import may be incomplete
+                    logging.warning("Ignore incomplete record in journal {}".format(self.path))
+
+    def start(self):
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self._append({"action": "start"})
+
+    def done(self):
+        self._append({"action": "done"})
+        self._compact()
+
+    def record(self, action, coll_name, obj_name, obj_id, hash=None):
+        record = {"action": action, "coll": coll_name, "name": obj_name, "id": obj_id}
+        if hash: record["hash"] = hash
+        self._append(record)
+
+    def _append(self, record):
+        line = json.dumps(dict(portal=self.portal, target=self.target, **record))+"\n"
+        with self._lock, self._locked(fcntl and fcntl.LOCK_SH) as fd:
+            # a single write to a file opened for appending is never interleaved
+            # with the records of other processes
+            os.write(fd, line.encode("utf-8"))
+            os.fsync(fd)
+
+    def _compact(self):
+        # keep only the records of each portal and target since its last
+        # start, and none of those which are done
+        if fcntl is None:
+            return
+        with self._lock, self._locked(fcntl.LOCK_EX):
+            runs = {}
+            for record in self._records():
+                key = (record.get("portal"), record.get("target"))
+                if record["action"] == "start":
+                    runs[key] = [record]
+                elif record["action"] == "done":
+                    runs.pop(key, None)
+                else:
+                    runs.setdefault(key, []).append(record)
+            with atomic_write(self.path, encoding="utf-8") as f:
+                for records in runs.values():
+                    f.writelines(json.dumps(record)+"\n" for record in records)
+
+    @contextlib.contextmanager
+    def _locked(self, operation):
+        # the journal opened for appending and locked, appends share the lock,
+        # a compaction holds it alone and replaces the file, which the other
+        # imports notice and open it again
+        while True:
+            if self._fd is None:
+                self._fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            if operation:
+                fcntl.flock(self._fd, operation)
+            try:
+                replaced = os.fstat(self._fd).st_ino != os.stat(self.path).st_ino
+            except FileNotFoundError:
+                replaced = True
+            if not replaced:
+                break
+            self._close()
+        try:
+            yield self._fd
+        finally:
+            if operation:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+            if self._closed:
+                self._close()
+
+    def close(self):
+        with self._lock:
+            self._closed = True
+            self._close()
+
+    def _close(self):
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
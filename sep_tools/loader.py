@@ -0,0 +1,88 @@
+import codecs
+import hashlib
+import json
+import logging
+import os
+import pickle
+
+import yaml
+
+from .writer import atomic_write
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    # the libyaml based loader is an order of magnitude faster
+    from yaml import CSafeLoader as SafeLoader
+except ImportError:
+    from yaml import SafeLoader
+
+CACHE_VERSION = 1
+
+def parse_spec(data):
+    if data.startswith(codecs.BOM_UTF8):
+        data = data[len(codecs.BOM_UTF8):]
+    if data.lstrip()[:1] in (b"{", b"["):
+        try:
+            return orjson.loads(data) if orjson else json.loads(data)
+        except ValueError:
+            # not JSON, but a YAML document starting with a flow collection
+            pass
+    return yaml.load(data, Loader=SafeLoader)
+
+def load_spec(spec_path):
+    with open(spec_path, "rb") as f:
+        return parse_spec(f.read())
+
+
+class SpecCache:
+    """On-disk cache of parsed specs, keyed by the SHA-256 of the spec file
+
+    Besides the parsed spec, each entry keeps the schemas already resolved
+    by the RefResolver for every cycle policy, see 'resolved'.
+    """
+
+    def __init__(self, cache_dir):
+        self.cache_dir = cache_dir
+        self.entry = None
+        self._path = None
+        self._saved = 0
+
+    def load(self, spec_path):
+        with open(spec_path, "rb") as f:
+            data = f.read()
+        key = hashlib.sha256(data).hexdigest()
+        self._path = os.path.join(self.cache_dir, "{}.v{}.pickle".format(key, CACHE_VERSION))
+
+        self.entry = None
+        if os.path.exists(self._path):
+            try:
+                with open(self._path, "rb") as f:
+                    self.entry = pickle.load(f)
+                logging.info("Load parsed '{}' from cache {}".format(spec_path, self._path))
+            except Exception as e:
+                logging.warning("Ignore broken cache file {}: {}".format(self._path, e))
+
+        if self.entry is None:
+            self.entry = {"spec": parse_spec(data), "resolved": {}}
+            self.save()
+        self._saved = self._count()
+        return self.entry["spec"]
+
+    def resolved(self, cycle_policy, max_depth):
+        # the resolver fills this table, call save() afterwards to keep it
+        return self.entry["resolved"].setdefault((cycle_policy, max_depth), {})
+
+    def save(self):
+        if self.entry is None or (os.path.exists(self._path) and self._count() == self._saved):
+            return
+        os.makedirs(self.cache_dir, exist_ok=True)
+        with atomic_write(self._path, "wb") as f:
+            pickle.dump(self.entry, f, protocol=pickle.HIGHEST_PROTOCOL)
+        self._saved = self._count()
+
+    def _count(self):
+        return sum(len(r) for r in self.entry["resolved"].values())
@@ -0,0 +1,209 @@
+import contextlib
+import json
+import threading
+import time
+from urllib.parse import urlparse, unquote
+
+METRICS_FORMATS = ['json', 'prometheus']
+# upper bounds in seconds of the latency histogram buckets
+LATENCY_BUCKETS = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10]
+
+EP_PREFIX = "/api/v1/eventPortal/"
+SEMP_PREFIX = "/SEMP/v2/config/msgVpns/"
+
+def endpoint(verb, url):
+    # e.g. "GET /api/v1/eventPortal/events/{id}", ids and names are replaced
+    # by placeholders so requests are counted per endpoint
+    parts = urlparse(url).path.split("/")
+    path = "/".join(parts)
+    if path.startswith(EP_PREFIX):
+        params = {5: "{id}"}
+    elif path.startswith(SEMP_PREFIX):
+        params = {5: "{vpn}", 7: "{queue}", 9: "{topic}"}
+    else:
+        params = {}
+    return "{} {}".format(verb.upper(), "/".join(params.get(i, unquote(p)) for i, p in enumerate(parts)))
+
+
+class EndpointStats:
+    def __init__(self):
+        self.requests = 0
+        self.errors = 0
+        self.retries = 0
+        self.bytesSent = 0
+        self.bytesReceived = 0
+        self.latencySum = 0.0
+        # one count per bucket of LATENCY_BUCKETS and one for all slower
+        self.latencyBuckets = [0]*(len(LATENCY_BUCKETS)+1)
+
+    def add(self, status, seconds, sent, received, retry):
+        self.requests += 1
+        if status is None or status >= 400: self.errors += 1
+        if retry: self.retries += 1
+        self.bytesSent += sent
+        self.bytesReceived += received
+        self.latencySum += seconds
+        for i, bound in enumerate(LATENCY_BUCKETS):
+            if seconds <= bound: break
+        else:
+            i = len(LATENCY_BUCKETS)
+        self.latencyBuckets[i] += 1
+
+    def to_json(self):
+        cumulative, buckets = 0, {}
+        for bound, count in zip(LATENCY_BUCKETS+["+Inf"], self.latencyBuckets):
+            cumulative += count
+            buckets[str(bound)] = cumulative
+        return {
+            "requests": self.requests,
+            "errors": self.errors,
+            "retries": self.retries,
+            "bytesSent": self.bytesSent,
+            "bytesReceived": self.bytesReceived,
+            "latency": {"sum": round(self.latencySum, 6), "buckets": buckets},
+        }
+
+
+class ScopeStats:
+    # the requests of the whole run or of a phase
+    def __init__(self):
+        self.duration = 0.0
+        self.runs = 0
+        self.endpoints = {}
+
+    def to_json(self):
+        endpoints = {name: stats.to_json() for name, stats in sorted(self.endpoints.items())}
+        result = {"duration": round(self.duration, 6), "runs": self.runs}
+        for key in ("requests", "errors", "retries", "bytesSent", "bytesReceived"):
+            result[key] = sum(e[key] for e in endpoints.values())
+        result["endpoints"] = endpoints
+        return result
+
+
+class Metrics:
+    """Records the duration of the phases of a run and every HTTP request
+    sent to the Event Portal or the broker.
+
+    A request is accounted to the whole run and to every phase running while
+    it's sent, or for a phase of a single thread only those sent by the
+    thread. Phases of the same name, e.g. of several targets of a batch,
+    are summed up. Nothing is recorded until 'enabled' is set.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.reset()
+
+    def reset(self):
+        self._lock = threading.Lock()
+        self._start = time.perf_counter()
+        self.total = ScopeStats()
+        self.phases = {}
+        # phase name -> number of phases of that name running
+        self._active = {}
+        # names of the phases of a single thread, in the thread
+        self._local = threading.local()
+
+    @contextlib.contextmanager
+    def phase(self, name, thread=False):
+        # thread=True for phases running concurrently with others, e.g. one per
+        # object sent, so they don't count each other's requests, the durations
+        # of their runs add up
+        if not self.enabled:
+            yield
+            return
+        if not hasattr(self._local, "phases"):
+            self._local.phases = []
+        local = self._local.phases
+        with self._lock:
+            stats = self.phases.setdefault(name, ScopeStats())
+            if thread:
+                local.append(name)
+            else:
+                self._active[name] = self._active.get(name, 0)+1
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            with self._lock:
+                stats.duration += time.perf_counter()-start
+                stats.runs += 1
+                if thread:
+                    local.remove(name)
+                else:
+                    self._active[name] -= 1
+
+    def request(self, verb, url, status, seconds, sent=0, received=0, retry=False):
+        if not self.enabled:
+            return
+        key = endpoint(verb, url)
+        with self._lock:
+            names = [name for name, n in self._active.items() if n]
+            names += [name for name in getattr(self._local, "phases", []) if name not in names]
+            scopes = [self.total]+[self.phases[name] for name in names]
+            for scope in scopes:
+                stats = scope.endpoints.get(key)
+                if not stats: stats = scope.endpoints[key] = EndpointStats()
+                stats.add(status, seconds, sent, received, retry)
+
+    def to_json(self):
+        with self._lock:
+            self.total.duration = time.perf_counter()-self._start
+            self.total.runs = 1
+            return {
+                "total": self.total.to_json(),
+                "phases": {name: stats.to_json() for name, stats in self.phases.items()},
+            }
+
+    def to_prometheus(self):
+        summary = self.to_json()
+        scopes = [("total", summary["total"])]+list(summary["phases"].items())
+        lines = []
+        def header(name, kind, help_text):
+            lines.append("# HELP {} {}".format(name, help_text))
+            lines.append("# TYPE {} {}".format(name, kind))
+        def sample(name, labels, value):
+            lines.append("{}{{{}}} {}".format(name,
+                ",".join('{}="{}"'.format(k, _escape(v)) for k, v in labels), value))
+
+        header("sep_phase_duration_seconds", "gauge", "Time spent in the phase")
+        for phase, s in scopes:
+            sample("sep_phase_duration_seconds", [("phase", phase)], s["duration"])
+        header("sep_phase_runs_total", "counter", "Number of times the phase ran")
+        for phase, s in scopes:
+            sample("sep_phase_runs_total", [("phase", phase)], s["runs"])
+
+        endpoints = [(_labels(phase, e), stats) for phase, s in scopes for e, stats in s["endpoints"].items()]
+        for key, name, help_text in (
+            ("requests", "sep_requests_total", "HTTP requests sent"),
+            ("errors", "sep_request_errors_total", "HTTP requests failed or answered with an error status"),
+            ("retries", "sep_request_retries_total", "HTTP requests sent again"),
+            ("bytesSent", "sep_request_sent_bytes_total", "Bytes of the request bodies"),
+            ("bytesReceived", "sep_request_received_bytes_total", "Bytes of the response bodies")):
+            header(name, "counter", help_text)
+            for labels, stats in endpoints:
+                sample(name, labels, stats[key])
+
+        header("sep_request_duration_seconds", "histogram", "Latency of the HTTP requests")
+        for labels, stats in endpoints:
+            for bound, count in stats["latency"]["buckets"].items():
+                sample("sep_request_duration_seconds_bucket", labels+[("le", bound)], count)
+            sample("sep_request_duration_seconds_sum", labels, stats["latency"]["sum"])
+            sample("sep_request_duration_seconds_count", labels, stats["requests"])
+        return "\n".join(lines)+"\n"
+
+    def write(self, out, format="json"):
+        if format == "prometheus":
+            out.write(self.to_prometheus())
+        else:
+            out.write(json.dumps(self.to_json(), indent=2)+"\n")
+
+def _labels(phase, endpoint_key):
+    method, path = endpoint_key.split(" ", 1)
+    return [("phase", phase), ("method", method), ("endpoint", path)]
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+# recorder of the current process
+metrics = Metrics()
@@ -0,0 +1,305 @@
+"""Local stand-in of the Event Portal REST API and the SEMPv2 config API
+
+Implements the endpoints used by sep_tools with an in-memory store, so the
+tool could be run and benchmarked without a solace.cloud account or a broker:
+
+    $ python -m sep_tools.mockserver --port 8080 --latency 0.05
+    $ sep importOpenAPI spec.json --base-url http://localhost:8080 --token any
+    $ sep createQueue spec.json --host http://localhost:8080 --queue q1
+"""
+import hashlib
+import itertools
+import json
+import logging
+import threading
+import time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs, unquote, quote
+
+EP_PREFIX = "/api/v1/eventPortal/"
+SEMP_PREFIX = "/SEMP/v2/config/msgVpns/"
+MAX_PAGE_SIZE = 100
+
+EP_DEFAULTS = {
+    "applicationDomains": {"description": "", "topicDomain": "", "enforceUniqueTopicNames": False},
+    "applications": {"description": "", "consumedEventIds": [], "producedEventIds": []},
+    "schemas": {"description": "", "contentType": "JSON", "content": ""},
+    "events": {"description": "", "schemaId": None, "consumedApplicationIds": [],
+        "producedApplicationIds": []},
+}
+
+class MockServer:
+    """In-memory Event Portal and SEMP server running on a background thread
+
+    latency     : seconds added to every response
+    rate_limit  : maximum requests per second, above which 429 is returned
+    """
+
+    def __init__(self, host="127.0.0.1", port=0, latency=0.0, rate_limit=None):
+        self.latency = latency
+        self.rate_limit = rate_limit
+        self.lock = threading.Lock()
+        self.reset()
+
+        server = self
+        class Handler(MockHandler):
+            mock = server
+        self.httpd = ThreadingHTTPServer((host, port), Handler)
+        self.httpd.daemon_threads = True
+        self.url = "http://{}:{}".format(*self.httpd.server_address[:2])
+        self._thread = None
+
+    def reset(self):
+        with self.lock:
+            self.store = {coll: {} for coll in EP_DEFAULTS}
+            self.queues = {}
+            self.ids = itertools.count(1)
+            self.request_count = 0
+            self.requests = {}
+            self.throttled = 0
+            self._window = (0, 0)
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def count(self, method, endpoint):
+        # returns False if the request exceeds the rate limit
+        with self.lock:
+            self.request_count += 1
+            key = "{} {}".format(method, endpoint)
+            self.requests[key] = self.requests.get(key, 0) + 1
+            if not self.rate_limit:
+                return True
+            second, count = self._window
+            now = int(time.monotonic())
+            if now != second:
+                second, count = now, 0
+            count += 1
+            self._window = (second, count)
+            if count > self.rate_limit:
+                self.throttled += 1
+                return False
+            return True
+
+    def new_id(self):
+        return "{:08x}".format(next(self.ids))
+
+
+class MockHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # headers and body are written separately, don't delay the body
+    disable_nagle_algorithm = True
+    mock = None
+
+    def log_message(self, format, *args):
+        logging.debug(format % args)
+
+    def _send(self, code, body=None, headers={}):
+        data = json.dumps(body).encode("utf-8") if body is not None else b""
+        if self.command == "GET" and code == 200:
+            # responses are revalidated with the ETag of their content
+            etag = '"{}"'.format(hashlib.sha1(data).hexdigest())
+            headers = dict(headers, ETag=etag)
+            if self.headers.get("If-None-Match") == etag:
+                code, data = 304, b""
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for k, v in headers.items():
+            self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _body(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        return json.loads(self.rfile.read(length)) if length else {}
+
+    def _handle(self, method):
+        url = urlparse(self.path)
+        query = {k: v[0] for k, v in parse_qs(url.query).items()}
+        parts = [unquote(p) for p in url.path.split("/")]
+        if url.path.startswith(EP_PREFIX):
+            handler, params = self._event_portal, {5: "{id}"}
+        elif url.path.startswith(SEMP_PREFIX):
+            handler, params = self._semp, {5: "{vpn}", 7: "{queue}"}
+        else:
+            return self._send(404, {"message": "Not Found"})
+
+        # requests are counted per endpoint, e.g. "GET /api/v1/eventPortal/events/{id}"
+        endpoint = "/".join(params.get(i, p) for i, p in enumerate(parts))
+        body = self._body() if method in ("POST", "PATCH") else None
+        if not self.mock.count(method, endpoint):
+            return self._send(429, {"message": "Too Many Requests"}, {"Retry-After": "1"})
+        if self.mock.latency:
+            time.sleep(self.mock.latency)
+        with self.mock.lock:
+            handler(method, parts, query, body)
+
+    def do_GET(self): self._handle("GET")
+    def do_POST(self): self._handle("POST")
+    def do_PATCH(self): self._handle("PATCH")
+    def do_DELETE(self): self._handle("DELETE")
+
+    # ------------------------------ Event Portal ------------------------------
+
+    def _event_portal(self, method, parts, query, body):
+        # /api/v1/eventPortal/<coll>[/<id>[/generateAsyncApiRequest]]
+        coll = parts[4]
+        if coll not in self.mock.store:
+            return self._send(404, {"message": "Not Found"})
+        objs = self.mock.store[coll]
+        obj_id = parts[5] if len(parts) > 5 else None
+        if obj_id and obj_id not in objs:
+            return self._send(404, {"message": "Could not find {} {}".format(coll, obj_id)})
+
+        if method == "GET" and not obj_id:
+            return self._list(objs, query)
+        elif method == "GET":
+            return self._send(200, {"data": objs[obj_id]})
+        elif method == "POST" and len(parts) > 6 and parts[6] == "generateAsyncApiRequest":
+            return self._send(200, self._asyncapi(objs[obj_id], body))
+        elif method == "POST" and not obj_id:
+            now = int(time.time())
+            obj = dict(EP_DEFAULTS[coll], **body)
+            obj.update(id=self.mock.new_id(), createdTime=now, updatedTime=now,
+                revisionNumber=1)
+            objs[obj["id"]] = obj
+            self._link_application(coll, obj)
+            return self._send(201, {"data": obj})
+        elif method == "PATCH" and obj_id:
+            obj = objs[obj_id]
+            obj.update(body)
+            obj.update(updatedTime=int(time.time()), revisionNumber=obj["revisionNumber"]+1)
+            self._link_application(coll, obj)
+            return self._send(200, {"data": obj})
+        elif method == "DELETE" and obj_id:
+            del objs[obj_id]
+            return self._send(204)
+        self._send(405, {"message": "Method Not Allowed"})
+
+    def _list(self, objs, query):
+        data = list(objs.values())
+        for key in ("name", "applicationDomainId", "schemaId", "topicName"):
+            if key in query:
+                data = [o for o in data if o.get(key) == query[key]]
+        if "ids" in query:
+            ids = set(query["ids"].split(","))
+            data = [o for o in data if o["id"] in ids]
+
+        page_size = min(int(query.get("pageSize", 20)), MAX_PAGE_SIZE)
+        page_number = int(query.get("pageNumber", 1))
+        total_pages = max(1, -(-len(data)//page_size))
+        page = data[(page_number-1)*page_size:page_number*page_size]
+        self._send(200, {"data": page, "meta": {"pagination": {
+            "pageNumber": page_number,
+            "count": len(data),
+            "pageSize": page_size,
+            "nextPage": page_number+1 if page_number < total_pages else None,
+            "totalPages": total_pages,
+        }}})
+
+    def _link_application(self, coll, obj):
+        # keep the application ids of events in line with the applications
+        if coll != "applications": return
+        for key, event_key in (("consumedEventIds", "consumedApplicationIds"),
+            ("producedEventIds", "producedApplicationIds")):
+            event_ids = set(obj.get(key) or [])
+            for event in self.mock.store["events"].values():
+                app_ids = [i for i in event[event_key] if i != obj["id"]]
+                if event["id"] in event_ids: app_ids.append(obj["id"])
+                event[event_key] = app_ids
+
+    def _asyncapi(self, app, request):
+        events = self.mock.store["events"]
+        schemas = self.mock.store["schemas"]
+        channels = {}
+        # as in AsyncAPI 2, the operations are those of the other side: events
+        # the application consumes are published to it, those it produces are
+        # subscribed to
+        for op, key in (("publish", "consumedEventIds"), ("subscribe", "producedEventIds")):
+            for event_id in app.get(key) or []:
+                event = events.get(event_id)
+                if not event: continue
+                message = {"name": event["name"], "description": event["description"]}
+                schema = schemas.get(event["schemaId"])
+                if schema and schema["contentType"] == "JSON" and schema["content"]:
+                    message["payload"] = json.loads(schema["content"])
+                channels.setdefault(event["topicName"], {})[op] = {"message": message}
+        return {
+            "asyncapi": request.get("asyncApiVersion", "2.0.0"),
+            "info": {"title": app["name"], "description": app["description"], "version": "1"},
+            "channels": channels,
+        }
+
+    # ---------------------------------- SEMP ----------------------------------
+
+    def _semp_error(self, http_code, code, status, description):
+        self._send(http_code, {"meta": {"error": {
+            "code": code, "status": status, "description": description}, "responseCode": http_code}})
+
+    def _semp(self, method, parts, query, body):
+        # /SEMP/v2/config/msgVpns/<vpn>/queues[/<queue>/subscriptions]
+        queues = self.mock.queues.setdefault(parts[5], {})
+        if len(parts) == 7 and parts[6] == "queues" and method == "POST":
+            if body["queueName"] in queues:
+                return self._semp_error(400, 10, "ALREADY_EXISTS", "Queue already exists")
+            queues[body["queueName"]] = []
+            return self._send(200, {"data": body, "meta": {"responseCode": 200}})
+        if len(parts) != 9 or parts[6] != "queues" or parts[8] != "subscriptions":
+            return self._send(404, {"meta": {"responseCode": 404}})
+        if parts[7] not in queues:
+            return self._semp_error(400, 6, "NOT_FOUND", "Could not find queue")
+
+        subscriptions = queues[parts[7]]
+        if method == "POST":
+            if body["subscriptionTopic"] in subscriptions:
+                return self._semp_error(400, 10, "ALREADY_EXISTS", "Subscription already exists")
+            subscriptions.append(body["subscriptionTopic"])
+            return self._send(200, {"data": body, "meta": {"responseCode": 200}})
+        if method != "GET":
+            return self._send(405, {"meta": {"responseCode": 405}})
+
+        count = int(query.get("count", 10))
+        cursor = int(query.get("cursor", 0))
+        meta = {"responseCode": 200}
+        if cursor+count < len(subscriptions):
+            meta["paging"] = {"cursorUri": "http://{}{}?count={}&cursor={}".format(
+                self.headers["Host"], "/".join(quote(p, safe="") for p in parts), count, cursor+count)}
+        self._send(200, {"meta": meta, "data": [
+            {"msgVpnName": parts[5], "queueName": parts[7], "subscriptionTopic": t}
+            for t in subscriptions[cursor:cursor+count]]})
+
+
+if __name__ == '__main__':
+    import click
+
+    @click.command()
+    @click.option('--host', default="127.0.0.1", show_default=True)
+    @click.option('--port', default=8080, show_default=True)
+    @click.option('--latency', default=0.0, show_default=True,
+        help='Seconds added to every response')
+    @click.option('--rate-limit', default=None, type=int,
+        help='Maximum requests per second, 429 is returned above it')
+    def main(host, port, latency, rate_limit):
+        """Run a local stand-in of the Event Portal and SEMPv2 API"""
+        logging.basicConfig(level=logging.INFO)
+        mock = MockServer(host, port, latency, rate_limit)
+        logging.info("Mock Event Portal/SEMP server listening on {}".format(mock.url))
+        try:
+            mock.httpd.serve_forever()
+        except KeyboardInterrupt:
+            pass
+
+    main()
@@ -0,0 +1,165 @@
+import hashlib
+import json
+import logging
+import re
+
+CYCLE_POLICIES = ['ref', 'depth']
+
+class RefResolver:
+    """Inline local '#/components/schemas/...' references of an OpenAPI spec.
+
+    Every component schema is resolved at most once (per remaining depth) and
+    the result is shared by all of its referrers, the source spec is never
+    modified. References between schemas of the same reference cycle are
+    handled by the cycle policy:
+
+    - 'ref'   : keep the '$ref' as it is
+    - 'depth' : unroll the cycle up to 'max_depth' times, then emit '{}'
+    """
+
+    _refSchemaRe = re.compile(r'\#\/components\/schemas/([^\/]+)$')
+
+    def __init__(self, spec, cycle_policy="ref", max_depth=3, resolved=None):
+        if cycle_policy not in CYCLE_POLICIES:
+            raise ValueError("Unknown cycle policy '{}', must be one of {}".format(
+                cycle_policy, CYCLE_POLICIES))
+        self.components = spec.get("components", {}).get("schemas", {})
+        self.cycle_policy = cycle_policy
+        self.max_depth = max_depth if cycle_policy == "depth" else 0
+        # (schemaName, remaining depth) -> resolved schema, could be preset
+        # with the table of a previous run on the same spec
+        self.resolved = {} if resolved is None else resolved
+        self._cycles = self._find_cycles()
+        # id of a resolved node -> (node, digest), the node is kept so its id
+        # is not reused
+        self._digests = {}
+
+    def resolve_component(self, schemaName):
+        return self._resolve_name(schemaName, None, self.max_depth)
+
+    def resolve(self, payload):
+        # resolve an inline schema object, e.g. the schema of a request body
+        return self._resolve_node(payload, None, self.max_depth)
+
+    def digest(self, node):
+        """Hash of a resolved schema, equal for schemas of equal content.
+
+        A node is hashed from the digests of its children and memoized, so
+        a component shared by many schemas is hashed once instead of once
+        per schema it is inlined in."""
+        if type(node) is dict:
+            # keys as json.dumps writes them, YAML mappings may mix int and str keys
+            items = sorted(((json.dumps(_json_key(k)), v) for k, v in node.items()), key=lambda item: item[0])
+        elif type(node) is list:
+            items = ((json.dumps(i), v) for i, v in enumerate(node))
+        else:
+            return json.dumps(node)
+        memo = self._digests.get(id(node))
+        if memo is not None:
+            return memo[1]
+        text = ",".join("{}:{}".format(k, self.digest(v)) for k, v in items)
+        digest = "#"+hashlib.sha256((("{" if type(node) is dict else "[")+text).encode("utf-8")).hexdigest()
+        self._digests[id(node)] = (node, digest)
+        return digest
+
+    def _ref_name(self, payload):
+        ref = payload.get("$ref")
+        if type(ref) is str:
+            m = self._refSchemaRe.search(ref)
+            if m: return m.group(1)
+        return None
+
+    def _resolve_name(self, schemaName, cycle, depth):
+        if schemaName not in self.components:
+            logging.error("Could not find schema '{}' in components".format(schemaName))
+            raise SystemExit
+
+        if cycle is not None and self._cycles.get(schemaName) == cycle:
+            # reference back into the cycle we are resolving
+            if depth == 0:
+                logging.debug("Cyclic reference on schema '{}'".format(schemaName))
+                if self.cycle_policy == "ref":
+                    return {"$ref": "#/components/schemas/"+schemaName}
+                return {}
+            depth -= 1
+        else:
+            depth = self.max_depth
+
+        key = (schemaName, depth)
+        if key not in self.resolved:
+            self.resolved[key] = self._resolve_node(self.components[schemaName],
+                self._cycles.get(schemaName), depth)
+        return self.resolved[key]
+
+    def _resolve_node(self, payload, cycle, depth):
+        if type(payload) is dict:
+            schemaName = self._ref_name(payload)
+            if schemaName:
+                return self._resolve_name(schemaName, cycle, depth)
+            return {k: self._resolve_node(v, cycle, depth) for k, v in payload.items()}
+        elif type(payload) is list:
+            return [self._resolve_node(v, cycle, depth) for v in payload]
+        return payload
+
+    def _collect_refs(self, payload, refs):
+        if type(payload) is dict:
+            schemaName = self._ref_name(payload)
+            if schemaName:
+                refs.add(schemaName)
+                return refs
+            for v in payload.values():
+                self._collect_refs(v, refs)
+        elif type(payload) is list:
+            for v in payload:
+                self._collect_refs(v, refs)
+        return refs
+
+    def _find_cycles(self):
+        # Tarjan's strongly connected components over the reference graph,
+        # returns {schemaName: cycle id} for every schema within a cycle
+        graph = {name: self._collect_refs(schema, set()) & self.components.keys()
+            for name, schema in self.components.items()}
+        index, lowlink, on_stack = {}, {}, set()
+        stack, cycles = [], {}
+
+        for root in graph:
+            if root in index: continue
+            work = [(root, iter(graph[root]))]
+            index[root] = lowlink[root] = len(index)
+            stack.append(root)
+            on_stack.add(root)
+            while work:
+                node, children = work[-1]
+                child = next(children, None)
+                if child is not None:
+                    if child not in index:
+                        index[child] = lowlink[child] = len(index)
+                        stack.append(child)
+                        on_stack.add(child)
+                        work.append((child, iter(graph[child])))
+                    elif child in on_stack:
+                        lowlink[node] = min(lowlink[node], index[child])
+                    continue
+
+                work.pop()
+                if work:
+                    parent = work[-1][0]
+                    lowlink[parent] = min(lowlink[parent], lowlink[node])
+                if lowlink[node] != index[node]: continue
+
+                scc = []
+                while True:
+                    member = stack.pop()
+                    on_stack.discard(member)
+                    scc.append(member)
+                    if member == node: break
+                if len(scc) > 1 or node in graph[node]:
+                    for member in scc:
+                        cycles[member] = index[node]
+        return cycles
+
+def _json_key(key):
+    # the string json.dumps makes of a key of a dict
+    if type(key) is str:
+        return key
+    return json.dumps(key) if key is None or type(key) is bool else repr(key)
@@ -0,0 +1,84 @@
+import asyncio
+import threading
+
+class TaskFailed(Exception):
+    # a call of the graph raised, error is what it raised
+    def __init__(self, error):
+        super().__init__(repr(error))
+        self.error = error
+
+class TaskCancelled(Exception):
+    # a call of the graph not started because another call failed
+    pass
+
+class TaskGraph:
+    """Runs blocking calls, e.g. requests, as soon as the calls they depend
+    on are done, instead of in rigid phases.
+
+    An asyncio loop tracks the dependencies while the calls themselves run on
+    'executor', so at most as many calls run at a time as it has workers.
+    Once a call failed no other call is started, the calls already running
+    are finished, and run() raises what the failed call raised.
+    """
+
+    def __init__(self, executor):
+        self.executor = executor
+        # key -> (fn, keys of the dependencies)
+        self.nodes = {}
+        # TaskFailed of the calls failed by the last run, first failed first
+        self._failed = []
+
+    def add(self, key, fn=None, deps=()):
+        # fn=None is a node without a call, others could still depend on it,
+        # dependencies must have been added before
+        for dep in deps:
+            if dep not in self.nodes:
+                raise KeyError("Unknown dependency {} of {}".format(dep, key))
+        self.nodes[key] = (fn, list(deps))
+        return key
+
+    def run(self):
+        # returns the results by key, or raises what the first failed call raised
+        results = asyncio.run(self._run())
+        if self._failed:
+            raise self._failed[0].error
+        return results
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        tasks = {}
+        # set by the first failed call, calls already queued on the executor
+        # check it too, so they return without running
+        stop = threading.Event()
+        self._failed = []
+
+        async def run_node(fn, deps):
+            if deps:
+                await asyncio.gather(*(tasks[dep] for dep in deps))
+            if fn is None:
+                return None
+            if stop.is_set():
+                raise TaskCancelled()
+            result, error = await loop.run_in_executor(self.executor, _call, fn, stop)
+            if isinstance(error, TaskCancelled):
+                raise error
+            if error is not None:
+                stop.set()
+                self._failed.append(TaskFailed(error))
+                raise self._failed[-1]
+            return result
+
+        for key, (fn, deps) in self.nodes.items():
+            tasks[key] = asyncio.ensure_future(run_node(fn, deps))
+        results = await asyncio.gather(*tasks.values(), return_exceptions=True)
+        return dict(zip(tasks.keys(), results))
+
+def _call(fn, stop):
+    # SystemExit of a failed request must not stop the loop while other
+    # calls are still running, so errors are returned instead
+    if stop.is_set():
+        return None, TaskCancelled()
+    try:
+        return fn(), None
+    except BaseException as e:
+        return None, e
@@ -0,0 +1,75 @@
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import quote
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from .util import sempv2, safeget
+
+class SempClient:
+    """SEMPv2 config client of one message vpn of a broker
+
+    Like the EventPortalClient, all requests share one pooled session and
+    independent requests run concurrently on at most 'concurrency' threads.
+    """
+
+    def __init__(self, host, vpn, admin_user, admin_password,
+        concurrency=8, retries=5, backoff=0.5):
+        self.host = host
+        self.vpn = vpn
+        self.admin_user = admin_user
+        self.admin_password = admin_password
+        self.concurrency = max(1, concurrency)
+        self.retries = retries
+        self.backoff = backoff
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.concurrency)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def sempv2(self, verb, url, data_json=None, params=None, accepted_errors=()):
+        if url.startswith("/"):
+            url = "{}/SEMP/v2/config/msgVpns/{}{}".format(self.host, quote(self.vpn, safe=""), url)
+        return sempv2(verb, url, self.admin_user, self.admin_password, data_json, params,
+            session=self.session, retries=self.retries, backoff=self.backoff,
+            accepted_errors=accepted_errors)
+
+    def create_queue(self, queue):
+        # returns False if the queue already exists
+        rJson = self.sempv2("post", "/queues", queue, accepted_errors=("ALREADY_EXISTS",))
+        return safeget(rJson, "meta", "error", "status") != "ALREADY_EXISTS"
+
+    def get_subscriptions(self, queueName):
+        url = "/queues/{}/subscriptions".format(quote(queueName, safe=""))
+        params = {"count": 100, "select": "subscriptionTopic"}
+        topics = set()
+        while url:
+            rJson = self.sempv2("get", url, params=params)
+            topics.update(sub["subscriptionTopic"] for sub in rJson["data"])
+            # the cursor uri already contains all query parameters
+            url = safeget(rJson, "meta", "paging", "cursorUri")
+            params = None
+        return topics
+
+    def add_subscriptions(self, queueName, topics):
+        # add the subscriptions the queue doesn't have yet concurrently,
+        # returns the topics added
+        existing = self.get_subscriptions(queueName)
+        missing = [t for t in dict.fromkeys(topics) if t not in existing]
+        url = "/queues/{}/subscriptions".format(quote(queueName, safe=""))
+
+        def add(topic):
+            rJson = self.sempv2("post", url, {"subscriptionTopic": topic},
+                accepted_errors=("ALREADY_EXISTS",))
+            return safeget(rJson, "meta", "error", "status") != "ALREADY_EXISTS"
+
+        if self.concurrency == 1 or len(missing) <= 1:
+            added = list(map(add, missing))
+        else:
+            with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+                added = list(executor.map(add, missing))
+        return [t for t, a in zip(missing, added) if a]
+
+    def close(self):
+        self.session.close()
@@ -0,0 +1,99 @@
+"""Local snapshot of an Application Domain, written by 'sep snapshot'
+
+A snapshot is a file of JSON lines, gzip compressed unless written with
+--no-compress:
+
+    {"format": "sep-snapshot", "version": 2, "domain": "<name>", ...}
+    {"coll": "events", "data": {...}}       one line per object
+    ...
+    {"coll": "asyncApis", "data": {"id": "<application id>", "document": {...}}}
+    ...
+    {"index": {"events": {"<id>": <offset of the line>, ...}, ...}}
+
+The objects are the domain itself, its applications, events and schemas,
+the events and schemas of other domains they refer to, and the AsyncAPI
+spec the portal generated of each application. An uncompressed
+snapshot is memory-mapped and only the objects asked for are parsed, a
+compressed one is read at once.
+"""
+import contextlib
+import gzip
+import json
+import logging
+import mmap
+import time
+
+from .writer import atomic_write
+
+SNAPSHOT_FORMAT = "sep-snapshot"
+SNAPSHOT_VERSION = 2
+SNAPSHOT_COLLS = ["applicationDomains", "applications", "events", "schemas", "asyncApis"]
+
+def write_snapshot(path, domain_name, colls, compress=True, source=None):
+    # colls is coll name -> list of objects, written in their order
+    with atomic_write(path, "wb") as raw, \
+        (gzip.GzipFile(fileobj=raw, mode="wb") if compress else contextlib.nullcontext(raw)) as f:
+        header = {
+            "format": SNAPSHOT_FORMAT,
+            "version": SNAPSHOT_VERSION,
+            "domain": domain_name,
+            "source": source,
+            "createdTime": int(time.time()),
+            "counts": {coll_name: len(colls.get(coll_name, [])) for coll_name in SNAPSHOT_COLLS},
+        }
+        offset = f.write(_line(header))
+        index = {}
+        for coll_name in SNAPSHOT_COLLS:
+            offsets = index[coll_name] = {}
+            for obj in colls.get(coll_name, []):
+                offsets[obj["id"]] = offset
+                offset += f.write(_line({"coll": coll_name, "data": obj}))
+        f.write(_line({"index": index}))
+
+def _line(obj):
+    return (json.dumps(obj, separators=(",", ":"))+"\n").encode("utf-8")
+
+class Snapshot:
+    """Read only Event Portal of a snapshot file, answering the same lookups
+    EventPortal sends to the portal"""
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            compressed = f.read(2) == b"\x1f\x8b"
+        if compressed:
+            with gzip.open(path, "rb") as f:
+                self._data = f.read()
+            self._file = None
+        else:
+            self._file = open(path, "rb")
+            self._data = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        self.header = json.loads(self._data[:self._data.find(b"\n")+1])
+        if self.header.get("format") != SNAPSHOT_FORMAT or self.header.get("version") != SNAPSHOT_VERSION:
+            logging.error("{} is no snapshot of version {}".format(path, SNAPSHOT_VERSION))
+            raise SystemExit
+        last = self._data.rfind(b"\n", 0, len(self._data)-1)+1
+        self.index = json.loads(self._data[last:])["index"]
+
+    def _object(self, offset):
+        # objects are parsed when asked for, one line each
+        return json.loads(self._data[offset:self._data.find(b"\n", offset)+1])["data"]
+
+    def getObjectsByIds(self, coll, ids):
+        offsets = self.index.get(coll, {})
+        return [self._object(offsets[obj_id]) for obj_id in dict.fromkeys(ids) if obj_id in offsets]
+
+    def getAllObjects(self, coll, query_dict):
+        for offset in self.index.get(coll, {}).values():
+            obj = self._object(offset)
+            if all(obj.get(k) == v for k, v in query_dict.items()):
+                yield obj
+
+    def getObjectByName(self, coll, name):
+        return next(self.getAllObjects(coll, {"name": name}), None)
+
+    def close(self):
+        if self._file:
+            self._data.close()
+            self._file.close()
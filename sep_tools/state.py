@@ -0,0 +1,53 @@
+import hashlib
+import json
+import logging
+import os
+
+from .writer import atomic_write
+
+STATE_VERSION = 1
+
+def portal_key(base_url, token):
+    # the portal and organization objects are imported to, the token is
+    # only kept as a digest
+    return "{} {}".format(base_url.rstrip("/"), hashlib.sha256(token.encode("utf-8")).hexdigest()[:32])
+
+class SyncState:
+    """Local state file of 'importOpenAPI --sync'
+
+    For every imported domain/application of each portal it records the id
+    and the content hash of each Event Portal object as it was last sent,
+    and whether the object was created by this import (only those are ever
+    deleted). The portal is told by its URL and a digest of the token, so
+    imports of one spec to different organizations don't share ids.
+
+    {
+      "version": 1,
+      "portals": {
+        "<base url> <token digest>": {
+          "<domain>/<application>": {
+            "<collection>": {"<name>": {"id": "...", "hash": "...", "owned": true}}
+          }
+        }
+      }
+    }
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.data = {"version": STATE_VERSION, "portals": {}}
+        if os.path.exists(path):
+            with open(path) as f:
+                data = json.load(f)
+            if data.get("version") != STATE_VERSION:
+                logging.warning("Ignore state file {} of version {}".format(path, data.get("version")))
+            else:
+                self.data = data
+
+    def target(self, portal, domain, application):
+        targets = self.data["portals"].setdefault(portal, {})
+        return targets.setdefault("{}/{}".format(domain, application), {})
+
+    def save(self):
+        with atomic_write(self.path) as f:
+            json.dump(self.data, f, indent=2, sort_keys=True)
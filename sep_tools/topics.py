@@ -0,0 +1,78 @@
+import math
+
+def level_covers(sub_level, topic_level):
+    # whether a subscription level like "*" or "cus*" matches a topic level
+    if sub_level == "*" or sub_level == topic_level:
+        return True
+    if sub_level.endswith("*") and not topic_level.endswith("*"):
+        return topic_level.startswith(sub_level[:-1])
+    return False
+
+def covers(sub, topic):
+    # whether subscription covers topic, both tuples of levels
+    for i, sub_level in enumerate(sub):
+        if sub_level == ">" and i == len(sub)-1:
+            return len(topic) > i
+        if i >= len(topic) or not level_covers(sub_level, topic[i]):
+            return False
+    return len(sub) == len(topic)
+
+def remove_covered(topics):
+    # drop the topics already matched by a wildcard subscription of another one
+    wildcards = [t for t in topics if any(l == ">" or l.endswith("*") for l in t)]
+    return {t for t in topics if not any(w != t and covers(w, t) for w in wildcards)}
+
+def compact_topics(topics, max_overmatch=1):
+    """Minimize a list of Solace topic subscriptions using a topic trie.
+
+    Topics covered by a wildcard of another topic are always dropped. Sibling
+    levels are collapsed into '*' and subtrees into '>', as long as a single
+    wildcard doesn't overmatch more than 'max_overmatch' topics.
+
+    The overmatch of a wildcard is the number of topics it matches but that
+    were not requested, built from the tokens of the requested topics seen on
+    each level plus one for all other tokens, e.g. collapsing 'p/a/x' and
+    'p/b/x' into 'p/*/x' overmatches 1 (any other level but 'a' and 'b'),
+    collapsing 'p/a/x' and 'p/b/y' into 'p/*/x' and 'p/*/y' overmatches 4
+    ('p/a/y', 'p/b/x' and any other level followed by 'x' or 'y'). The first
+    level is never collapsed.
+    """
+    levels = {tuple(t.split("/")) for t in topics}
+    compacted = _compact(remove_covered(levels), max_overmatch, True)
+    return sorted("/".join(t) for t in remove_covered(compacted))
+
+def _compact(suffixes, max_overmatch, is_root=False):
+    # suffixes: the set of topics below a trie node as tuples of levels,
+    # the empty tuple means the node itself is a topic
+    groups = {}
+    for s in suffixes:
+        if s: groups.setdefault(s[0], set()).add(s[1:])
+    children = {token: _compact(rest, max_overmatch) for token, rest in groups.items()}
+
+    # 1. collapse all children into '*', the cost is counted on the requested
+    # topics, a wildcard below stands for all the tokens it replaced
+    if len(children) > 1 and not is_root:
+        union = set().union(*groups.values())
+        cost = sum(len(union)-len(rest) for rest in groups.values()) + len(union)
+        if cost <= max_overmatch:
+            children = {"*": _compact(union, max_overmatch)}
+
+    result = {(token,)+rest for token, rest in children.items() for rest in rest}
+    # 2. collapse the whole subtree into '>'
+    if len(result) > 1 and not is_root and \
+            _subtree_overmatch({s for s in suffixes if s}) <= max_overmatch:
+        result = {(">",)}
+    if () in suffixes:
+        result.add(())
+    return result
+
+def _subtree_overmatch(suffixes):
+    # topics matched by '>' up to the depth of the subtree with the tokens seen
+    # on each depth plus one other, plus one for all deeper topics
+    depth = max(len(s) for s in suffixes)
+    vocab = [set() for i in range(depth)]
+    for s in suffixes:
+        for i, level in enumerate(s):
+            vocab[i].add(level)
+    shapes = sum(math.prod(len(v)+1 for v in vocab[:d]) for d in range(1, depth+1)) + 1
+    return shapes - len(suffixes)
@@ -1,6 +1,12 @@
+import hashlib
 import json
 import requests
 import logging
+import sys
+import time
+
+from .metrics import metrics
+from .writer import LazyMapping, json_default, write_document
 
 HTTP_METHODS = [
     'get', 
@@ -12,27 +18,91 @@ HTTP_METHODS = [
     'patch', 
     'trace']
 
-def rest(verb, url, data_json=None, expected_code=200, params=None, token=None):
+# status codes on which the request has not been processed and may be resent
+RETRY_ALWAYS = [429, 503]
+# status codes on which only idempotent requests are resent
+RETRY_IDEMPOTENT = [500, 502, 504]
+IDEMPOTENT_METHODS = ['get', 'put', 'delete', 'options', 'head', 'trace']
+
+# shared by all callers, so connections to the same host are kept alive
+_session = requests.Session()
+
+def _retry_delay(r, attempt, backoff):
+    retry_after = r.headers.get("Retry-After") if r is not None else None
+    if retry_after:
+        try:
+            return float(retry_after)
+        except ValueError:
+            pass
+    return backoff * (2 ** attempt)
+
+def send(verb, url, session=None, retries=0, backoff=0.5, **kwargs):
+    # send a request, resend it on throttling, server errors and broken connections
+    session = session or _session
+    attempt = 0
+    data = kwargs.get("data")
+    sent = len(data.encode("utf-8") if isinstance(data, str) else data) if data else 0
+    while True:
+        start = time.perf_counter()
+        try:
+            r = session.request(verb.upper(), url, **kwargs)
+        except requests.ConnectionError:
+            metrics.request(verb, url, None, time.perf_counter()-start, sent, 0, attempt > 0)
+            if attempt >= retries or verb not in IDEMPOTENT_METHODS: raise
+            r = None
+        else:
+            metrics.request(verb, url, r.status_code, time.perf_counter()-start,
+                sent, len(r.content), attempt > 0)
+            if attempt >= retries: return r
+            if r.status_code not in RETRY_ALWAYS and not \
+                (r.status_code in RETRY_IDEMPOTENT and verb in IDEMPOTENT_METHODS):
+                return r
+
+        delay = _retry_delay(r, attempt, backoff)
+        logging.warning("{} on {} returns {}, retry in {:.1f}s".format(verb.upper(), url,
+            r.status_code if r is not None else "connection error", delay))
+        time.sleep(delay)
+        attempt += 1
+
+def rest(verb, url, data_json=None, expected_code=200, params=None, token=None,
+    session=None, retries=0, backoff=0.5, accepted_codes=()):
     headers={"content-type": "application/json"}
     if token : headers["Authorization"] = "Bearer "+token
-    str_json = json.dumps(data_json) if data_json != None else None
-    r = getattr(requests, verb)(url, headers=headers,
+    # JSONText values of the payload are serialized only now
+    str_json = json.dumps(data_json, default=json_default) if data_json != None else None
+    r = send(verb, url, session, retries, backoff, headers=headers,
         data=(str_json), params=params)
+    return check_response(verb, url, r, expected_code, data_json, accepted_codes)
+
+def check_response(verb, url, r, expected_code=200, data_json=None, accepted_codes=()):
+    # accepted_codes: statuses like 404 not to fail on, None is returned for them
+    if r.status_code in accepted_codes:
+        return None
     if (r.status_code != expected_code):
         logging.error("{} on {} returns {}".format(verb.upper(), url, r.status_code))
-        if data_json: print(json.dumps(data_json, indent=2))
+        if data_json: print(json.dumps(data_json, indent=2, default=json_default))
         print(r.text)
         raise SystemExit
 
-    return r.json()
+    # e.g. 204 No Content on DELETE
+    return r.json() if r.content else None
 
-def sempv2(verb, url, admin_user, admin_password, data_json=None):
+def sempv2(verb, url, admin_user, admin_password, data_json=None, params=None,
+    session=None, retries=0, backoff=0.5, accepted_errors=()):
+    # accepted_errors: SEMP error statuses like "ALREADY_EXISTS" not to fail on,
+    # the response of such an error is returned as it is
     headers={"content-type": "application/json"}
     str_json = json.dumps(data_json,indent=2) if data_json != None else None
-    r = getattr(requests, verb)(url, headers=headers,
+    r = send(verb, url, session, retries, backoff, headers=headers,
         auth=(admin_user, admin_password),
-        data=(str_json))
+        data=(str_json), params=params)
     if r.status_code != 200:
+        try:
+            error_status = safeget(r.json(), "meta", "error", "status")
+        except ValueError:
+            error_status = None
+        if error_status and error_status in accepted_errors:
+            return r.json()
         print("{} on {} returns {}".format(verb.upper(), url, r.status_code))
         if str_json: print(str_json)
         print(r.text)
@@ -40,6 +110,11 @@ def sempv2(verb, url, admin_user, admin_password, data_json=None):
     else:
         return r.json()
 
+def content_hash(obj):
+    # stable hash of a JSON object, independent of the order of keys
+    str_json = json.dumps(obj, sort_keys=True, separators=(",", ":"), default=json_default)
+    return hashlib.sha256(str_json.encode("utf-8")).hexdigest()
+
 def safeget(dct, *keys):
     for key in keys:
         try:
@@ -49,33 +124,18 @@ def safeget(dct, *keys):
     return dct
 
 
-def generateOpenAPISpec(app_name, description, event_list, schema_list):
-    # 1. init the spec
-    spec = {
-        "openapi": "3.0.0",
-        "info": {
-            "title": app_name,
-            "description": description if description else "",
-            "version": "1.0.0"
-        },
-        "components": {
-            "schemas": {}
-        },
-        "paths": {}
-    }
-    
-    # 2. generate all schemas
-    schemas = spec["components"]["schemas"]
-    for es in schema_list:
-        if es["contentType"]=="JSON" and es["content"]:
-            # only support JSON schema ("JSON","XML","Text","Binary")
-            schemas[es["name"]] = json.loads(es["content"])
-
-    # 3. generate all path
+def generateOpenAPISpec(app_name, description, event_list, schema_list, out=None, format="json"):
+    # 1. index the JSON schemas by id, their content is only parsed when written
+    # ("JSON","XML","Text","Binary")
+    schema_index = {es["id"]: es for es in schema_list \
+        if es["contentType"]=="JSON" and es["content"]}
+
+    # 2. generate all path
+    paths = {}
     for e in event_list:
         path = e["topicName"]
         http_method = path.split("/")[0].lower()
-        logging.info("{}, {}".format(path, http_method))
+        logging.debug("{}, {}".format(path, http_method))
         if http_method in HTTP_METHODS:
             # This is a event topic generated from REST url
             path = path[len(http_method):]
@@ -102,12 +162,12 @@ def generateOpenAPISpec(app_name, description, event_list, schema_list):
                 }
             }
         }
-        if path not in spec["paths"]: spec["paths"][path] = {}
-        spec["paths"][path][http_method] = operation
+        if path not in paths: paths[path] = {}
+        paths[path][http_method] = operation
 
         if e["schemaId"] == None: continue # no related schema, therefore no request body
-        ep_schema = [s for s in schema_list if s["id"]==e["schemaId"]][0]
-        if not safeget(spec, "components", "schemas", ep_schema["name"]): continue
+        ep_schema = schema_index.get(e["schemaId"])
+        if not ep_schema: continue
         operation["requestBody"] = {
             "content": {
                 "application/json": {
@@ -117,7 +177,26 @@ def generateOpenAPISpec(app_name, description, event_list, schema_list):
                 }
             }
         }
+    # schemas of the same name, e.g. of other domains, are written once at
+    # the place of the first with the content of the last
+    components = {}
+    for es in schema_index.values():
+        components[es["name"]] = es
+    logging.info("Generated {} paths with {} schemas from {} events".format(
+        len(paths), len(components), len(event_list)))
 
-
-    # 4. output the spec
-    print(json.dumps(spec, indent=2))
+    # 3. output the spec, paths and schemas are written one by one
+    spec = {
+        "openapi": "3.0.0",
+        "info": {
+            "title": app_name,
+            "description": description if description else "",
+            "version": "1.0.0"
+        },
+        "components": {
+            "schemas": LazyMapping((name, json.loads(es["content"])) \
+                for name, es in components.items())
+        },
+        "paths": LazyMapping(paths.items())
+    }
+    write_document(out or sys.stdout, spec, format)
@@ -0,0 +1,62 @@
+import json
+import multiprocessing
+import sys
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+from .resolver import RefResolver
+
+# the resolver of a worker process, its table of resolved components is
+# kept for all tasks the worker runs
+_resolver = None
+# whether the workers compute the digests of the schemas
+_digests = True
+# components handed over to forked workers without pickling them
+_shared = None
+
+def serialize_schema(resolver, schema, digest=True):
+    # (digest, JSON content) of a schema resolved by resolver, the content is
+    # sent back to the importing process as a string, the digest is only
+    # needed to deduplicate schemas
+    return resolver.digest(schema) if digest else None, json.dumps(schema)
+
+def resolve_schemas(spec, tasks, cycle_policy="ref", max_depth=3, workers=2, digests=True):
+    """Resolve and serialize schemas on a pool of 'workers' processes.
+
+    tasks is a list of (schemaName, isComponent, schema), schema being the
+    inline schema object of non component schemas. Returns the result of
+    serialize_schema for every task in the same order, so merging them is
+    as deterministic as resolving them one after another.
+    """
+    global _shared
+    components = {"components": {"schemas": spec.get("components", {}).get("schemas", {})}}
+    # workers are forked on Linux, elsewhere only while no other thread runs,
+    # e.g. the system libraries of macOS are unsafe in a child forked from
+    # a threaded process
+    fork = "fork" in multiprocessing.get_all_start_methods() and \
+        (sys.platform.startswith("linux") or threading.active_count() == 1)
+    if fork:
+        # workers inherit the parsed components from this process
+        _shared = (components, cycle_policy, max_depth, digests)
+        context, initargs = multiprocessing.get_context("fork"), ()
+    else:
+        context, initargs = multiprocessing.get_context(), (components, cycle_policy, max_depth, digests)
+
+    # tasks are sent in chunks, a few per worker to balance the load
+    chunksize = max(1, len(tasks)//(workers*4))
+    try:
+        with ProcessPoolExecutor(workers, context, _init_worker, initargs) as executor:
+            return list(executor.map(_serialize_task, tasks, chunksize=chunksize))
+    finally:
+        _shared = None
+
+def _init_worker(*args):
+    global _resolver, _digests
+    components, cycle_policy, max_depth, _digests = args or _shared
+    _resolver = RefResolver(components, cycle_policy, max_depth)
+
+def _serialize_task(task):
+    schemaName, isComponent, schema = task
+    if isComponent:
+        return serialize_schema(_resolver, _resolver.resolve_component(schemaName), _digests)
+    return serialize_schema(_resolver, _resolver.resolve(schema), _digests)
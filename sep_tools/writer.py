@@ -0,0 +1,134 @@
+import contextlib
+import itertools
+import json
+import os
+import tempfile
+
+FORMATS = ['json', 'compact', 'yaml']
+
+# the umask can only be read by setting it
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+
+class LazyMapping:
+    """A mapping given as an iterable of (key, value) pairs, which
+    write_document consumes one pair at a time, so the values could be
+    generated and released while the document is written"""
+
+    def __init__(self, items):
+        self.items = items
+
+    def __iter__(self):
+        return iter(self.items)
+
+class JSONText:
+    """The JSON text of a value, e.g. the content of a schema, which is
+    serialized only when a request or hash needs it (see json_default), so
+    the value could share its nodes with other values instead of being kept
+    as a string of its own. The value must not be modified."""
+
+    __slots__ = ("value",)
+
+    def __init__(self, value):
+        self.value = value
+
+    def __str__(self):
+        return json.dumps(self.value)
+
+    def __eq__(self, other):
+        if isinstance(other, JSONText):
+            return self.value == other.value
+        return isinstance(other, str) and str(self) == other
+
+    __hash__ = None
+
+def json_default(obj):
+    # default of json.dumps, a JSONText is dumped as the string it stands for
+    if isinstance(obj, JSONText):
+        return str(obj)
+    raise TypeError("Object of type {} is not JSON serializable".format(type(obj).__name__))
+
+def _is_streamed(obj):
+    # whether obj is written piece by piece instead of serialized at once
+    if isinstance(obj, LazyMapping):
+        return True
+    return isinstance(obj, dict) and any(_is_streamed(v) for v in obj.values())
+
+def write_document(out, doc, format="json"):
+    """Write doc to the text stream out as JSON indented by 2 spaces (same as
+    json.dumps(doc, indent=2)), compact JSON or YAML. LazyMapping values
+    anywhere in doc are written item by item."""
+    if format == "yaml":
+        _write_yaml(out, doc, 0)
+    else:
+        _write_json(out, doc, 0, 2 if format == "json" else None)
+        out.write("\n")
+
+@contextlib.contextmanager
+def atomic_write(path, mode="w", encoding=None):
+    """Open a temporary file next to path, which replaces path once the block
+    is done, so no reader, e.g. a concurrent run, sees a partial file"""
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), suffix=".tmp")
+    try:
+        # mkstemp creates the file readable by the owner only, path keeps its
+        # mode or gets the one open() would give it
+        try:
+            os.fchmod(fd, os.stat(path).st_mode & 0o777)
+        except FileNotFoundError:
+            os.fchmod(fd, 0o666 & ~_UMASK)
+        with os.fdopen(fd, mode, encoding=encoding) as f:
+            yield f
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+def _write_json(out, obj, level, indent):
+    if not _is_streamed(obj):
+        if indent:
+            text = json.dumps(obj, indent=indent)
+            out.write(text.replace("\n", "\n"+" "*indent*level) if level else text)
+        else:
+            out.write(json.dumps(obj, separators=(",", ":")))
+        return
+
+    items = obj.items() if isinstance(obj, dict) else obj
+    sep = ": " if indent else ":"
+    first = True
+    out.write("{")
+    for key, value in items:
+        if not first: out.write(",")
+        if indent: out.write("\n"+" "*indent*(level+1))
+        out.write(json.dumps(key)+sep)
+        _write_json(out, value, level+1, indent)
+        first = False
+    if indent and not first: out.write("\n"+" "*indent*level)
+    out.write("}")
+
+def _yaml():
+    # yaml is imported on first use, the CLI imports this module on startup
+    import yaml
+    try:
+        return yaml, yaml.CSafeDumper
+    except AttributeError:
+        return yaml, yaml.SafeDumper
+
+def _write_yaml(out, items, level):
+    yaml, SafeDumper = _yaml()
+    pad = "  "*level
+    for key, value in (items.items() if isinstance(items, dict) else items):
+        if not _is_streamed(value):
+            text = yaml.dump({key: value}, Dumper=SafeDumper, sort_keys=False,
+                default_flow_style=False, allow_unicode=True)
+            out.write("".join(pad+line for line in text.splitlines(True)))
+            continue
+
+        key_text = pad+yaml.dump(key, Dumper=SafeDumper).split("\n")[0]+":"
+        value_items = iter(value.items() if isinstance(value, dict) else value)
+        first = next(value_items, None)
+        if first is None:
+            # a mapping without items, which would otherwise become null
+            out.write(key_text+" {}\n")
+        else:
+            out.write(key_text+"\n")
+            _write_yaml(out, itertools.chain([first], value_items), level+1)
@@ -16,6 +16,9 @@ setup(
         'PyYAML',
         'requests',
     ],
+    extras_require={
+        'fast': ['orjson'],
+    },
     entry_points={
         "console_scripts": [
             "sep=sep_tools.cmd:cli",
@@ -0,0 +1,100 @@
+import json
+import os
+
+import pytest
+
+from sep_tools.EventPortal import EventPortal
+from sep_tools.journal import ImportJournal
+from sep_tools.mockserver import MockServer
+
+SPEC = os.path.join(os.path.dirname(__file__), os.pardir, "api-samples", "buy_order_v1_beta_oas3.json")
+
+def lines(path):
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f]
+
+def test_entries_since_last_start(tmp_path):
+    path = str(tmp_path / "journal.jsonl")
+    journal = ImportJournal(path, "portal", "D", "A")
+    journal.start()
+    journal.record("create", "schemas", "s1", "1", "h1")
+    journal.start()
+    journal.record("create", "schemas", "s2", "2", "h2")
+    journal.record("update", "events", "e1", "3", "h3")
+    journal.close()
+
+    # a new run of the same target replays what the last one sent
+    entries = ImportJournal(path, "portal", "D", "A").entries()
+    assert [(e["action"], e["name"], e["id"], e["hash"]) for e in entries] == \
+        [("create", "s2", "2", "h2"), ("update", "e1", "3", "h3")]
+    assert ImportJournal(path, "portal", "D", "B").entries() == []
+    assert ImportJournal(path, "other portal", "D", "A").entries() == []
+
+def test_incomplete_record_ignored(tmp_path):
+    path = str(tmp_path / "journal.jsonl")
+    journal = ImportJournal(path, "portal", "D", "A")
+    journal.start()
+    journal.record("create", "schemas", "s1", "1", "h1")
+    journal.close()
+    with open(path, "a", encoding="utf-8") as f:
+        f.write('{"portal": "portal", "target": "D/A", "act')
+    assert [e["name"] for e in ImportJournal(path, "portal", "D", "A").entries()] == ["s1"]
+
+def test_done_compacts(tmp_path):
+    path = str(tmp_path / "journal.jsonl")
+    a = ImportJournal(path, "portal", "D", "A")
+    b = ImportJournal(path, "portal", "D", "B")
+    a.start()
+    b.start()
+    a.record("create", "schemas", "s1", "1", "h1")
+    b.record("create", "schemas", "s2", "2", "h2")
+    a.done()
+    # only the records of the import not done are kept, b goes on appending
+    assert [(r["target"], r["action"]) for r in lines(path)] == [("D/B", "start"), ("D/B", "create")]
+    b.record("create", "schemas", "s3", "3", "h3")
+    assert [e["name"] for e in b.entries()] == ["s2", "s3"]
+    b.done()
+    assert lines(path) == []
+    a.close()
+    b.close()
+
+def test_resume_sends_the_rest(tmp_path):
+    journal_file = str(tmp_path / "journal.jsonl")
+    with MockServer() as m:
+        ep = EventPortal("token", base_url=m.url, journal_file=journal_file, concurrency=4)
+        rest = ep.client.rest
+        posts = []
+        def crashing_rest(verb, url, *args, **kwargs):
+            if verb == "post":
+                posts.append(url)
+                if len(posts) > 20: raise SystemExit("crash")
+            return rest(verb, url, *args, **kwargs)
+        ep.client.rest = crashing_rest
+        with pytest.raises(SystemExit):
+            ep.importOpenAPISpec(SPEC, "D", "A")
+        created = sum(len(objs) for objs in m.store.values())
+        assert created == 20
+        assert len(lines(journal_file)) == 21
+
+        ep = EventPortal("token", base_url=m.url, journal_file=journal_file, resume=True)
+        rest = ep.client.rest
+        sent = []
+        ep.client.rest = lambda verb, url, *args, **kwargs: (sent.append(verb), rest(verb, url, *args, **kwargs))[1]
+        ep.importOpenAPISpec(SPEC, "D", "A")
+        # the objects journaled are neither looked up nor created again
+        total = sum(len(objs) for objs in m.store.values())
+        assert sent.count("post") == total - created
+        assert sent.count("get") == total - created
+        for objs in m.store.values():
+            assert len({obj["name"] for obj in objs.values()}) == len(objs)
+        app = list(m.store["applications"].values())[0]
+        assert sorted(app["consumedEventIds"]) == sorted(m.store["events"])
+        assert lines(journal_file) == []
+
+def test_no_journal_by_default(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    with MockServer() as m:
+        EventPortal("token", base_url=m.url).importOpenAPISpec(SPEC, "D", "A")
+        EventPortal("token", base_url=m.url, cache_dir="cache").importOpenAPISpec(SPEC, "D", "A")
+    assert sorted(os.listdir(tmp_path)) == ["cache"]
+    assert lines(tmp_path / "cache" / "journal.jsonl") == []
@@ -0,0 +1,42 @@
+import os
+
+import pytest
+
+from sep_tools.EventPortal import EventPortal
+from sep_tools.mockserver import MockServer
+
+SAMPLES = os.path.join(os.path.dirname(__file__), os.pardir, "api-samples")
+
+@pytest.fixture(scope="module")
+def portal():
+    with MockServer() as m:
+        for i, name in enumerate(["buy_order_v1_beta_oas3.json", "buy_browse_v1_beta_oas3.json"]):
+            ep = EventPortal("token", pubFlag=(i == 1), base_url=m.url)
+            ep.importOpenAPISpec(os.path.join(SAMPLES, name), "D", "App{}".format(i))
+        # an application of another domain is not part of the snapshot
+        ep = EventPortal("token", base_url=m.url)
+        ep.importOpenAPISpec(os.path.join(SAMPLES, "Google_standard_payment-openapi3.json"), "Other", "App2")
+        yield m
+
+def read(path):
+    with open(path, "rb") as f:
+        return f.read()
+
+@pytest.mark.parametrize("format", ["json", "yaml"])
+@pytest.mark.parametrize("compress", [True, False])
+def test_generate_from_snapshot(portal, tmp_path, compress, format):
+    snapshot_file = str(tmp_path / "d.snap")
+    EventPortal("token", base_url=portal.url).snapshotDomain("D", snapshot_file, compress)
+    live, offline = str(tmp_path / "live"), str(tmp_path / "offline")
+    EventPortal("token", base_url=portal.url).generateOpenApi("D", live, format)
+
+    requests = portal.request_count
+    ep = EventPortal(snapshot_file=snapshot_file)
+    ep.generateOpenApi("D", offline, format)
+    assert read(offline) == read(live) and b"paths" in read(live)
+    for app in portal.store["applications"].values():
+        if app["name"] != "App2":
+            assert ep._generateAsyncApiDoc(app["id"]) == \
+                EventPortal("token", base_url=portal.url)._generateAsyncApiDoc(app["id"])
+    # nothing but the documents compared is requested from the portal
+    assert portal.request_count - requests == 2
@@ -0,0 +1,15 @@
+import json
+import os
+import subprocess
+import sys
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir)
+# modules only the commands need, importing the CLI must not pull them in
+HEAVY_MODULES = ["requests", "yaml", "sep_tools.client", "sep_tools.loader", "concurrent.futures", "sqlite3"]
+
+def test_cli_imports_no_heavy_modules():
+    code = "import json, sys, sep_tools.cmd; print(json.dumps(sorted(sys.modules)))"
+    r = subprocess.run([sys.executable, "-c", code], cwd=ROOT, check=True, stdout=subprocess.PIPE)
+    modules = set(json.loads(r.stdout))
+    assert "sep_tools.cmd" in modules
+    assert [name for name in HEAVY_MODULES if name in modules] == []
@@ -0,0 +1,46 @@
+import random
+
+import pytest
+
+from sep_tools.topics import compact_topics, covers
+
+def split(topics):
+    return [tuple(t.split("/")) for t in topics]
+
+def assert_covered(topics, compacted):
+    # every topic requested is still matched by a subscription compacted
+    for topic in split(topics):
+        assert any(covers(sub, topic) for sub in split(compacted)), topic
+
+def random_topics(seed, count=60):
+    rng = random.Random(seed)
+    return ["/".join(rng.choice("abc") for i in range(rng.randint(1, 4))) for i in range(count)]
+
+@pytest.mark.parametrize("max_overmatch", [0, 1, 4, 20])
+@pytest.mark.parametrize("seed", range(5))
+def test_round_trip(seed, max_overmatch):
+    topics = random_topics(seed)
+    compacted = compact_topics(topics, max_overmatch)
+    assert_covered(topics, compacted)
+    assert len(compacted) <= len(set(topics))
+    if max_overmatch == 0:
+        assert compacted == sorted(set(topics))
+
+def test_no_overmatch_keeps_topics():
+    topics = ["p/a/x", "p/b/y", "p/a/y/z"]
+    assert compact_topics(topics, 0) == sorted(topics)
+
+def test_covered_topics_dropped():
+    assert compact_topics(["p/>", "p/a/x", "p/b", "q/a"], 0) == ["p/>", "q/a"]
+
+def test_wildcards():
+    assert compact_topics(["p/a/x", "p/b/x"], 1) == ["p/*/x"]
+    assert compact_topics(["p/a/x", "p/b/y"], 3) == ["p/a/x", "p/b/y"]
+    # the first level is never collapsed
+    assert compact_topics(["a/x", "b/x"], 10) == ["a/x", "b/x"]
+
+def test_nested_wildcards_overmatch():
+    # 'p/a/b/*' replaces 'c' and 'd', so 'p/a/>' overmatches 6 topics and not 5
+    topics = ["p/a/b/c", "p/a/b/d", "p/a/b"]
+    assert compact_topics(topics, 5) == ["p/a/b", "p/a/b/*"]
+    assert compact_topics(topics, 6) == ["p/a/>"]